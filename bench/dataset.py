@@ -0,0 +1,13 @@
+"""Vocabulary and credentials shared by the seed script and the load scenarios."""
+
+PASSWORD = "bench-password"
+WORDS = ["интеграция", "отчёт", "миграция", "оплата", "платёж", "клиент", "авторизация", "поиск",
+         "уведомление", "экспорт", "импорт", "дашборд", "релиз", "тестирование", "дизайн", "API",
+         "мобильное", "приложение", "сервер", "база", "данных", "кэш", "очередь", "профиль",
+         "настройки", "документация", "ошибка", "производительность", "безопасность", "метрики"]
+TAGS = ["backend", "frontend", "api", "bug", "feature", "design", "devops", "qa", "docs", "mobile",
+        "security", "performance", "research", "billing", "analytics", "infra", "ux", "support"]
+PRIORITIES = ["on_fire", "urgent", "high", "medium", "low"]
+PRIORITY_WEIGHTS = [1, 3, 10, 25, 11]
+NAMES = ["Иван", "Анна", "Пётр", "Мария", "Алексей", "Елена", "Дмитрий", "Ольга", "Сергей", "Наталья"]
+SURNAMES = ["Иванов", "Петрова", "Сидоров", "Смирнова", "Кузнецов", "Попова", "Васильев", "Соколова"]
@@ -0,0 +1,274 @@
+"""Scripted load against a running API seeded by bench/seed.py.
+
+    python bench/load.py run [--base-url http://localhost:8001] [--users 50] [--duration 60]
+                             [--scenario mixed|board|list|auth] [--seed 42] [--out runs/before.json]
+    python bench/load.py compare runs/before.json runs/after.json
+
+Every virtual user is an independent client with its own cookies that logs in
+as bench_user_N and then issues requests back to back, so --users is the
+concurrency level. Scenarios:
+
+    mixed  board reads with a share of task mutations and searches
+    board  read-only board traffic: projects, task pages, task cards
+    list   board traffic over the unpaginated GET /api/task/all/, so builds
+           without GET /api/task/page/ can be measured with the same load
+    auth   login only, measures password hashing throughput
+
+The report lists request count, errors, throughput and p50/p95/p99 latency per
+endpoint. Saved runs are JSON files and can be compared with each other.
+Requires httpx.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from dataset import PASSWORD, WORDS, TAGS, PRIORITIES
+
+# Доли действий в сценарии: имя действия -> вес
+SCENARIOS = {
+    "mixed": {"projects": 10, "task_page": 30, "next_page": 10, "task_card": 25, "sections": 5,
+              "search": 5, "create_task": 5, "update_task": 10},
+    "board": {"projects": 10, "task_page": 35, "next_page": 15, "task_card": 30, "sections": 10},
+    "list": {"projects": 10, "task_list": 20, "task_card": 40, "sections": 10},
+    "auth": {"login": 1},
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str,
+                      **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            return None
+        return response
+
+
+class VirtualUser:
+    def __init__(self, number: int, args: argparse.Namespace, recorder: Recorder):
+        self.number = number
+        self.rnd = random.Random(args.seed * 100003 + number)
+        self.recorder = recorder
+        self.client = httpx.AsyncClient(base_url=args.base_url, timeout=30,
+                                        headers={"User-Agent": f"bench/{number}"})
+        self.projects: List[Dict[str, Any]] = []
+        self.task_ids: List[int] = []
+        self.cursor: Optional[str] = None
+        self.project_id: Optional[int] = None
+        # where task ids for cards and updates come from
+        self.load_tasks: Callable = self.task_page
+
+    async def login(self) -> bool:
+        response = await self.recorder.request(self.client, "POST /api/auth/login", "POST", "/api/auth/login",
+                                               json={"login": f"bench_user_{self.number}",
+                                                     "password": PASSWORD, "remember_me": False})
+        return response is not None
+
+    async def projects_list(self):
+        response = await self.recorder.request(self.client, "GET /api/project/all/", "GET", "/api/project/all/")
+        if response is not None:
+            self.projects = response.json()
+
+    def _project(self) -> Optional[Dict[str, Any]]:
+        return self.rnd.choice(self.projects) if self.projects else None
+
+    async def task_page(self):
+        project = self._project()
+        if project is None:
+            return await self.projects_list()
+        self.project_id = project["project_id"]
+        await self._page({"project_id": self.project_id, "limit": 100})
+
+    async def next_page(self):
+        if self.cursor is None:
+            return await self.task_page()
+        await self._page({"project_id": self.project_id, "limit": 100, "cursor": self.cursor})
+
+    async def _page(self, params: Dict[str, Any]):
+        response = await self.recorder.request(self.client, "GET /api/task/page/", "GET", "/api/task/page/",
+                                               params=params)
+        if response is not None:
+            page = response.json()
+            self.cursor = page["next_cursor"]
+            self.task_ids = [task["id"] for task in page["items"]] or self.task_ids
+
+    async def task_list(self):
+        project = self._project()
+        if project is None:
+            return await self.projects_list()
+        response = await self.recorder.request(self.client, "GET /api/task/all/", "GET", "/api/task/all/",
+                                               params={"project_id": project["project_id"]})
+        if response is not None:
+            self.task_ids = [task["id"] for task in response.json()] or self.task_ids
+
+    async def task_card(self):
+        if not self.task_ids:
+            return await self.load_tasks()
+        await self.recorder.request(self.client, "GET /api/task/{task_id}", "GET",
+                                    f"/api/task/{self.rnd.choice(self.task_ids)}")
+
+    async def sections(self):
+        project = self._project()
+        if project is None:
+            return await self.projects_list()
+        await self.recorder.request(self.client, "GET /api/sections/{project_id}/section", "GET",
+                                    f"/api/sections/{project['project_id']}/section")
+
+    async def search(self):
+        params = {"q": self.rnd.choice(WORDS)}
+        project = self._project()
+        if project is not None:
+            params["project_id"] = project["project_id"]
+        await self.recorder.request(self.client, "GET /api/task/search/", "GET", "/api/task/search/",
+                                    params=params)
+
+    def _task_fields(self) -> Dict[str, Any]:
+        return {"executor_id": None,
+                "priority": self.rnd.choice(PRIORITIES),
+                "deadline": (datetime.now(timezone.utc) + timedelta(days=self.rnd.randint(1, 30))).isoformat(),
+                "finished": None,
+                "finished_at": None,
+                "completion_time": None,
+                "tags": self.rnd.sample(TAGS, 2)}
+
+    async def create_task(self):
+        project = self._project()
+        if project is None or not project["section_ids"]:
+            return await self.projects_list()
+        section = self.rnd.choice(project["section_ids"])
+        response = await self.recorder.request(self.client, "POST /api/task/", "POST", "/api/task/",
+                                               json={"project_id": project["project_id"],
+                                                     "section_id": section["section_id"],
+                                                     "name": " ".join(self.rnd.sample(WORDS, 4)),
+                                                     "description": " ".join(self.rnd.sample(WORDS, 12)),
+                                                     **self._task_fields()})
+        if response is not None:
+            self.task_ids.append(response.json()["task_id"])
+
+    async def update_task(self):
+        if not self.task_ids:
+            return await self.load_tasks()
+        await self.recorder.request(self.client, "PATCH /api/task/{task_id}", "PATCH",
+                                    f"/api/task/{self.rnd.choice(self.task_ids)}",
+                                    json={"section_id": None, **self._task_fields()})
+
+    async def run(self, scenario: Dict[str, int], deadline: float):
+        actions: Dict[str, Callable] = {"projects": self.projects_list, "task_page": self.task_page,
+                                        "next_page": self.next_page, "task_list": self.task_list,
+                                        "task_card": self.task_card, "sections": self.sections, "search": self.search,
+                                        "create_task": self.create_task, "update_task": self.update_task,
+                                        "login": self.login}
+        names, weights = list(scenario), list(scenario.values())
+        if "task_list" in scenario:
+            self.load_tasks = self.task_list
+        try:
+            if "login" not in scenario:
+                if not await self.login():
+                    return
+                await self.projects_list()
+            while time.perf_counter() < deadline:
+                await actions[self.rnd.choices(names, weights)[0]]()
+        finally:
+            await self.client.aclose()
+
+
+def _percentile(values: List[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] * 1000 if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] * 1000
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Dict[str, float]]:
+    endpoints = {}
+    for name in sorted(set(recorder.latencies) | set(recorder.errors)):
+        values = recorder.latencies[name]
+        endpoints[name] = {"count": len(values), "errors": recorder.errors[name], "rps": len(values) / elapsed,
+                           "p50": _percentile(values, 50), "p95": _percentile(values, 95),
+                           "p99": _percentile(values, 99)}
+    return endpoints
+
+
+def print_report(endpoints: Dict[str, Dict[str, float]]):
+    print(f"{'endpoint':<42} {'count':>8} {'errors':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in endpoints.items():
+        print(f"{name:<42} {row['count']:>8} {row['errors']:>7} {row['rps']:>8.1f} "
+              f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f}")
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]):
+    print(f"before: {before['meta']['started']} {before['meta']['scenario']}, {before['meta']['users']} users")
+    print(f"after:  {after['meta']['started']} {after['meta']['scenario']}, {after['meta']['users']} users")
+    print(f"{'endpoint':<42} {'rps':>18} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18}")
+    for name in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        old, new = before["endpoints"].get(name), after["endpoints"].get(name)
+        if old is None or new is None:
+            print(f"{name:<42} {'only in ' + ('after' if old is None else 'before'):>18}")
+            continue
+        cells = []
+        for key in ("rps", "p50", "p95", "p99"):
+            delta = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{new[key]:8.1f} ({delta:+6.1f}%)")
+        print(f"{name:<42} " + " ".join(f"{cell:>18}" for cell in cells))
+
+
+async def run(args: argparse.Namespace):
+    recorder = Recorder()
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    started = time.perf_counter()
+    deadline = started + args.duration
+    users = [VirtualUser(args.first_user + i, args, recorder) for i in range(args.users)]
+    await asyncio.gather(*(user.run(SCENARIOS[args.scenario], deadline) for user in users))
+    endpoints = summarize(recorder, time.perf_counter() - started)
+    print_report(endpoints)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"started": started_at, "base_url": args.base_url, "scenario": args.scenario,
+                                "users": args.users, "duration": args.duration, "seed": args.seed},
+                       "endpoints": endpoints}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load scenarios and run comparison")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--base-url", default="http://localhost:8001")
+    run_parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    run_parser.add_argument("--first-user", type=int, default=1, help="number of the first bench_user_N")
+    run_parser.add_argument("--duration", type=float, default=60, help="seconds")
+    run_parser.add_argument("--scenario", choices=list(SCENARIOS), default="mixed")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--out", help="save the run as JSON")
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    args = parser.parse_args()
+    if args.command == "compare":
+        with open(args.before, encoding="utf-8") as before, open(args.after, encoding="utf-8") as after:
+            compare(json.load(before), json.load(after))
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
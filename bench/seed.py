@@ -0,0 +1,169 @@
+"""Synthetic dataset for load tests: users, projects, sections, tasks with tags and history.
+
+    python bench/seed.py [--users 2000] [--projects 20] [--sections 200] [--tasks 100000]
+                         [--messages 3] [--seed 42] [--epoch 2025-01-01] [--reset]
+
+Reads the database settings from the environment (or .env) like the app does.
+Every user gets the password from dataset.PASSWORD, user N logs in as bench_user_N.
+Rows are generated deterministically from --seed, so two runs with the same
+arguments produce the same database; timestamps lie in the year before --epoch.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Sequence, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import asyncpg  # noqa: E402
+
+from db import database_url  # noqa: E402
+from db.migrate import migrate  # noqa: E402
+from passwords import hash_password, shutdown_password_pool  # noqa: E402
+from ranks import even_ranks  # noqa: E402
+from dataset import PASSWORD, WORDS, TAGS, PRIORITIES, PRIORITY_WEIGHTS, NAMES, SURNAMES  # noqa: E402
+
+BATCH_SIZE = 10000
+EPOCH = "2025-01-01"
+
+TRUNCATE_SQL = """
+TRUNCATE task_time_interval, task_message, task, project_section, project_user, project,
+         user_session, user_info, "user" RESTART IDENTITY CASCADE
+"""
+SEQUENCES = {"user": "id", "project": "id", "project_section": "id", "task": "id", "task_message": "id"}
+
+
+def _sentence(rnd: random.Random, low: int, high: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(low, high))).capitalize()
+
+
+def _members(user_count: int, project_count: int, project_id: int) -> List[int]:
+    """Участники проекта: каждый пользователь состоит ровно в одном проекте"""
+    return list(range(project_id, user_count + 1, project_count))
+
+
+def _users(rnd: random.Random, count: int, password_hash: str) -> Tuple[list, list]:
+    users, infos = [], []
+    for user_id in range(1, count + 1):
+        users.append((user_id, f"bench_user_{user_id}", password_hash, f"bench_user_{user_id}@example.com", True))
+        infos.append((user_id, rnd.choice(SURNAMES), rnd.choice(NAMES), rnd.choice(["Backend", "Frontend",
+                                                                                  "QA", "PM", None])))
+    return users, infos
+
+
+def _epoch(value: str) -> datetime:
+    epoch = datetime.fromisoformat(value)
+    return epoch if epoch.tzinfo is not None else epoch.replace(tzinfo=timezone.utc)
+
+
+def _tasks(rnd: random.Random, args: argparse.Namespace,
+           sections: Sequence[Tuple[int, int]]) -> Iterator[Tuple[list, list]]:
+    """Пачки задач и их истории; размеры секций распределены неравномерно"""
+    now = args.epoch
+    weights = [rnd.paretovariate(1.2) for _ in sections]
+    members_of = {project_id: _members(args.users, args.projects, project_id)
+                  for project_id in range(1, args.projects + 1)}
+    # ranks follow task ids, so every section keeps its tasks in creation order
+    ranks = even_ranks(args.tasks)
+    message_id = 0
+    for start in range(0, args.tasks, BATCH_SIZE):
+        tasks, messages = [], []
+        picked = rnd.choices(sections, weights=weights, k=min(BATCH_SIZE, args.tasks - start))
+        for task_id, (section_id, project_id) in enumerate(picked, start=start + 1):
+            members = members_of[project_id]
+            author = rnd.choice(members)
+            created_at = now - timedelta(days=rnd.uniform(0, 365))
+            finished = rnd.random() < 0.3
+            deadline = created_at + timedelta(days=rnd.randint(1, 90)) if rnd.random() < 0.6 else None
+            tags = rnd.sample(TAGS, rnd.randint(1, 3)) if rnd.random() < 0.7 else None
+            tasks.append((task_id, _sentence(rnd, 2, 6), _sentence(rnd, 8, 30) if rnd.random() < 0.8 else None,
+                          section_id, created_at, created_at, author,
+                          rnd.choice(members) if rnd.random() < 0.8 else None,
+                          rnd.choices(PRIORITIES, PRIORITY_WEIGHTS)[0], deadline, finished,
+                          created_at + timedelta(days=rnd.randint(1, 60)) if finished else None,
+                          rnd.randint(0, 40 * 3600) if rnd.random() < 0.4 else 0, tags, ranks[task_id - 1]))
+            for _ in range(int(rnd.expovariate(1 / args.messages))):
+                message_id += 1
+                messages.append((message_id, task_id, rnd.choice(["inner", "declarative"]),
+                                 _sentence(rnd, 3, 15), rnd.choice(members),
+                                 created_at + timedelta(hours=rnd.uniform(0, 24 * 30))))
+        yield tasks, messages
+
+
+async def seed(args: argparse.Namespace):
+    rnd = random.Random(args.seed)
+    await migrate()
+    connection = await asyncpg.connect(database_url("postgresql"))
+    started = time.perf_counter()
+    try:
+        async with connection.transaction():
+            if args.reset:
+                await connection.execute(TRUNCATE_SQL)
+            elif await connection.fetchval('SELECT exists(SELECT 1 FROM "user")'):
+                sys.exit("Database is not empty, pass --reset to replace its contents")
+
+            users, infos = _users(rnd, args.users, await hash_password(PASSWORD))
+            await connection.copy_records_to_table("user", records=users,
+                                                   columns=["id", "username", "password", "email", "is_active"])
+            await connection.copy_records_to_table("user_info", records=infos,
+                                                   columns=["user_id", "surname", "name", "position"])
+
+            projects, project_users, sections = [], [], []
+            section_ranks = even_ranks(args.sections)
+            for project_id in range(1, args.projects + 1):
+                members = _members(args.users, args.projects, project_id)
+                projects.append((project_id, f"Bench project {project_id}", rnd.randint(1, 10), members[0]))
+                project_users.extend((project_id, user_id) for user_id in members)
+                for position in range(1, args.sections + 1):
+                    sections.append((len(sections) + 1, project_id, position, section_ranks[position - 1],
+                                     f"Секция {position}", rnd.randint(1, 8)))
+            await connection.copy_records_to_table("project", records=projects,
+                                                   columns=["id", "name", "icon_id", "created_by"])
+            await connection.copy_records_to_table("project_user", records=project_users,
+                                                   columns=["project_id", "user_id"])
+            await connection.copy_records_to_table("project_section", records=sections,
+                                                   columns=["id", "project_id", "position", "rank", "name", "color"])
+
+            task_count = message_count = 0
+            for tasks, messages in _tasks(rnd, args, [(section[0], section[1]) for section in sections]):
+                await connection.copy_records_to_table(
+                    "task", records=tasks,
+                    columns=["id", "name", "description", "section_id", "created_at", "updated_at", "created_by",
+                             "executor_id", "priority", "deadline", "finished", "finished_at",
+                             "completion_time", "tags", "rank"])
+                await connection.copy_records_to_table(
+                    "task_message", records=messages,
+                    columns=["id", "task_id", "message_type", "text", "created_by", "created_at"])
+                task_count += len(tasks)
+                message_count += len(messages)
+                print(f"  {task_count} tasks, {message_count} messages", end="\r", flush=True)
+            # end the progress line so the summary starts on its own
+            print()
+
+            for table, column in SEQUENCES.items():
+                await connection.execute(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', '{column}'), "
+                                         f"coalesce(max({column}), 0) + 1, false) FROM \"{table}\"")
+        await connection.execute("ANALYZE")
+    finally:
+        await connection.close()
+        shutdown_password_pool()
+    print(f"seeded {args.users} users, {args.projects} projects, {len(sections)} sections, "
+          f"{task_count} tasks, {message_count} messages in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the database with a synthetic dataset")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--sections", type=int, default=200, help="sections per project")
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--messages", type=float, default=3, help="average history records per task")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--epoch", type=_epoch, default=EPOCH,
+                        help="ISO date the generated history ends at, UTC unless given")
+    parser.add_argument("--reset", action="store_true", help="truncate existing data first")
+    asyncio.run(seed(parser.parse_args()))
@@ -0,0 +1,78 @@
+"""Serialization cost of a 10k-task page: the old per-model path against model_response.
+
+    python bench/serialization.py [--tasks 10000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+for name in ("DB_USERNAME", "DB_PASSWORD", "DB_NAME", "JWT_SECRET", "MINIO_ROOT_USER", "MINIO_ROOT_PASSWORD"):
+    os.environ.setdefault(name, "bench")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from routers.task import _task_info, task_page_adapter  # noqa: E402
+from responses import model_response  # noqa: E402
+from schemas.task import GetTaskInfo, GetTaskPage, UserInfoSchema  # noqa: E402
+
+Row = namedtuple("Row", ["id", "section_id", "name", "description", "deadline", "finished",
+                         "completion_time", "tags", "executor_id", "executor_name", "executor_surname"])
+
+
+def make_rows(count: int):
+    now = datetime.now(timezone.utc)
+    return [Row(i, i % 8, f"Task {i}", "Lorem ipsum dolor sit amet " * 4,
+                now + timedelta(days=i % 30) if i % 3 else None, i % 5 == 0, i * 7,
+                ["backend", "api"] if i % 2 else None,
+                i % 50 or None, "Иван", "Петров") for i in range(count)]
+
+
+async def old_path(rows, field):
+    items = []
+    for row in rows:
+        executor = None
+        if row.executor_id is not None:
+            executor = UserInfoSchema(id=row.executor_id, name=row.executor_name, surname=row.executor_surname)
+        items.append(GetTaskInfo(id=row.id, section_id=row.section_id, name=row.name,
+                                 description=row.description, executor=executor, deadline=row.deadline,
+                                 finished=row.finished, completion_time=row.completion_time, tags=row.tags))
+    content = await serialize_response(field=field, response_content=GetTaskPage(items=items, next_cursor=None),
+                                       is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def new_path(rows, _):
+    return model_response(task_page_adapter, {"items": [_task_info(row) for row in rows],
+                                              "next_cursor": None}).body
+
+
+async def measure(func, rows, field, repeat: int) -> float:
+    await func(rows, field)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await func(rows, field)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def main(args):
+    rows = make_rows(args.tasks)
+    field = create_response_field(name="Response_get_project_tasks", type_=GetTaskPage)
+    old = await measure(old_path, rows, field, args.repeat)
+    new = await measure(new_path, rows, field, args.repeat)
+    print(f"{args.tasks} tasks, {args.repeat} runs")
+    print(f"models + jsonable path: {old:8.2f} ms")
+    print(f"TypeAdapter path:       {new:8.2f} ms  (x{old / new:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
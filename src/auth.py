@@ -5,12 +5,16 @@ from typing import Dict, Any
 from fastapi import Request, Response, Cookie, Depends
 
 import jwt
+from sqlalchemy import delete, inspect, select
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime, timedelta, timezone
 import uuid
 import logging
 
 import errors
-from models.user import User, UserSession
+from cache import TTLCache
+from models.user import User, UserInfo, UserSession
 from schemas.auth import Refresh
 from db import Session, get_database
 from settings import settings
@@ -18,6 +22,13 @@ from settings import settings
 
 agent_parse = re.compile(r"^([\w]*)\/([\d\.]*)\s*(\((.*?)\)\s*(.*))?$")
 
+# Кэши хранят снимки столбцов, а не ORM-объекты: объекты одной сессии БД
+# нельзя разделять между запросами
+session_cache = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+user_cache = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+# Хеш пароля для проверки доступа не нужен и не хранится в общем кэше процесса
+_UNCACHED = {inspect(User).get_property_by_column(User.__table__.c.password).key}
+
 
 def set_cookie(access: str, response: Response, max_age: int):
     response.set_cookie("access", access, httponly=True, samesite="lax", max_age=max_age)
@@ -61,7 +72,7 @@ def decode_token(token: str, token_type: str, suppress: bool = False) -> Dict[st
         raise errors.token_validation_failed()
 
 
-def init_user_tokens(user: User, long: bool, request: Request, response: Response, db: Session) -> Refresh:
+async def init_user_tokens(user: User, long: bool, request: Request, response: Response, db: Session) -> Refresh:
     now = datetime.now(timezone.utc)
     identity = f"{uuid.uuid1(int(now.timestamp()))}"
     session = UserSession()
@@ -75,8 +86,10 @@ def init_user_tokens(user: User, long: bool, request: Request, response: Respons
         session.invalid_after = now + timedelta(hours=settings.JWT_REFRESH_EXPIRE)
         max_age = settings.JWT_REFRESH_EXPIRE * 3600
     db.add(session)
+    await db.flush()
+    await trim_user_sessions(db, user.id, settings.USER_SESSION_LIMIT, settings.SESSION_SWEEP_BATCH)
 
-    db.commit()
+    await db.commit()
     access_payload = {
         "role": "access",
         "session": session.id,
@@ -97,29 +110,108 @@ def init_user_tokens(user: User, long: bool, request: Request, response: Respons
     return Refresh(refresh=refresh)
 
 
-def verify_user_access(access: str, request: Request, db: Session) -> UserSession:
+def _snapshot(obj) -> Dict[str, Any] | None:
+    if obj is None:
+        return None
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs
+            if attr.key not in _UNCACHED}
+
+
+def _restore(model, snapshot: Dict[str, Any] | None):
+    if snapshot is None:
+        return None
+    obj = model.__mapper__.class_manager.new_instance()
+    for key, value in snapshot.items():
+        setattr(obj, key, value)
+    make_transient_to_detached(obj)
+    return obj
+
+
+def cache_session(session: UserSession):
+    session_cache.set((session.id, session.identity), _snapshot(session))
+    user_cache.set(session.user_id, (_snapshot(session.user), _snapshot(session.user.user_info)))
+
+
+def get_cached_session(session_id: int, identity: str, db: Session) -> UserSession | None:
+    """Восстановление сессии и участника из кэша без обращения к БД"""
+    session_data = session_cache.get((session_id, identity))
+    if session_data is None:
+        return None
+    user_data = user_cache.get(session_data["user_id"])
+    if user_data is None:
+        return None
+    session = _restore(UserSession, session_data)
+    user = _restore(User, user_data[0])
+    set_committed_value(user, "user_info", _restore(UserInfo, user_data[1]))
+    set_committed_value(session, "user", user)
+    db.add(session)
+    return session
+
+
+def invalidate_session(session: UserSession):
+    session_cache.pop((session.id, session.identity))
+
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+
+async def delete_sessions(db: Session, condition) -> int:
+    """Удаление сессий по условию вместе с их записями в кэше; возвращает число удалённых строк"""
+    removed = (await db.execute(delete(UserSession).where(condition)
+                                .returning(UserSession.id, UserSession.identity)
+                                .execution_options(synchronize_session=False))).all()
+    for session_id, identity in removed:
+        session_cache.pop((session_id, identity))
+    return len(removed)
+
+
+async def trim_user_sessions(db: Session, user_id: int, keep: int, limit: int) -> int:
+    """Удаление самых старых входов участника сверх keep, не больше limit строк за раз"""
+    stale = (select(UserSession.id)
+             .filter(UserSession.user_id == user_id)
+             .order_by(UserSession.id.desc())
+             .offset(keep)
+             .limit(limit)
+             .with_for_update(skip_locked=True))
+    return await delete_sessions(db, UserSession.id.in_(stale))
+
+
+def auth_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"session": session_cache.stats(), "user": user_cache.stats()}
+
+
+async def verify_user_access(access: str, request: Request, db: Session) -> UserSession:
     access_payload = decode_token(access, "access")
-    session: UserSession = db.query(UserSession).get(access_payload["session"])
-    if session is None:
-        raise errors.unauthorized()
+    session = get_cached_session(access_payload["session"], access_payload["identity"], db)
+    cached = session is not None
+    if not cached:
+        session = await db.get(UserSession, access_payload["session"],
+                               options=[joinedload(UserSession.user).joinedload(User.user_info)])
+        if session is None:
+            raise errors.unauthorized()
     if session.fingerprint != get_user_agent_info(request) or session.identity != access_payload["identity"]:
-        db.delete(session)
-        db.commit()
+        invalidate_session(session)
+        await db.delete(session)
+        await db.commit()
         raise errors.unauthorized()
+    if not cached:
+        cache_session(session)
     return session
 
 
-def refresh_user_tokens(access: str, refresh: str, request: Request, response: Response, db: Session) -> Refresh:
+async def refresh_user_tokens(access: str, refresh: str, request: Request, response: Response, db: Session) -> Refresh:
     access_payload = decode_token(access, "access", suppress=True)
     refresh_payload = decode_token(refresh, "refresh")
     if access_payload["identity"] != refresh_payload["identity"]:
         raise errors.token_validation_failed()
-    session: UserSession = db.query(UserSession).get(access_payload["session"])
+    session: UserSession = await db.get(UserSession, access_payload["session"])
     if session is None:
         raise errors.unauthorized()
+    invalidate_session(session)
     if session.fingerprint != get_user_agent_info(request) or session.identity != access_payload["identity"]:
-        db.delete(session)
-        db.commit()
+        await db.delete(session)
+        await db.commit()
         raise errors.unauthorized()
 
     now = datetime.now(timezone.utc)
@@ -132,7 +224,7 @@ def refresh_user_tokens(access: str, refresh: str, request: Request, response: R
     else:
         session.invalid_after = now + timedelta(hours=settings.JWT_REFRESH_EXPIRE)
         max_age = settings.JWT_REFRESH_EXPIRE * 3600
-    db.commit()
+    await db.commit()
 
     access_payload = {
         "role": "access",
@@ -157,7 +249,7 @@ def refresh_user_tokens(access: str, refresh: str, request: Request, response: R
 async def get_user_session(request: Request, access: str = Cookie(None),
                            db: Session = Depends(get_database)) -> UserSession:
     """Получение сессии участника организации"""
-    return verify_user_access(access, request, db)
+    return await verify_user_access(access, request, db)
 
 
 async def get_user(session: UserSession = Depends(get_user_session)) -> User:
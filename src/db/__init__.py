@@ -1,2 +1,2 @@
-from .session import get_database, with_database, Session
-from .initdb import create_tables
+from .session import get_database, with_database, json_dumps, database_url, Session
+from .routing import get_read_database
@@ -1,6 +0,0 @@
-from db.session import engine
-import models
-
-
-def create_tables():
-    models.base.Base.metadata.create_all(engine)
@@ -0,0 +1,144 @@
+"""Версионные миграции схемы.
+
+Миграция — файл db/versions/NNNN_<название>.sql. Новые миграции применяются
+по возрастанию номера, каждая в своей транзакции, номера применённых
+записываются в schema_version. При запуске приложение только сверяет
+версию схемы (check_schema), а миграции выполняются отдельно:
+
+    python -m db.migrate            применить новые миграции
+    python -m db.migrate status     текущая версия и ожидающие миграции
+"""
+import asyncio
+import logging
+import os
+import re
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError, SQLAlchemyError
+
+from settings import settings
+from .session import database_url, engine
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "versions")
+_VERSION_RE = re.compile(r"^(\d{4})_\w+\.sql$")
+
+CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version integer PRIMARY KEY,
+    name varchar NOT NULL,
+    applied_at timestamptz NOT NULL DEFAULT now()
+)
+"""
+# Транзакционная блокировка, чтобы параллельно запущенные миграции не выполнили одну версию дважды;
+# работает и через PgBouncer в режиме transaction
+LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('schema_version'))"
+
+
+def migrations() -> List[Tuple[int, str]]:
+    """Номера и файлы миграций по возрастанию номера"""
+    found = []
+    for name in os.listdir(VERSIONS_DIR):
+        match = _VERSION_RE.match(name)
+        if match:
+            found.append((int(match.group(1)), name))
+    return sorted(found)
+
+
+def latest_version() -> int:
+    found = migrations()
+    return found[-1][0] if found else 0
+
+
+async def _applied_versions(connection: asyncpg.Connection) -> List[int]:
+    if await connection.fetchval("SELECT to_regclass('schema_version') IS NULL"):
+        return []
+    return [row["version"] for row in await connection.fetch("SELECT version FROM schema_version")]
+
+
+async def migrate() -> List[Tuple[str, float]]:
+    """Применение новых миграций; возвращает применённые файлы и время выполнения в секундах"""
+    connection = await asyncpg.connect(database_url("postgresql"))
+    applied = []
+    try:
+        done = set(await _applied_versions(connection))
+        for version, name in migrations():
+            if version in done:
+                continue
+            with open(os.path.join(VERSIONS_DIR, name), encoding="utf-8") as f:
+                sql = f.read()
+            started = time.perf_counter()
+            async with connection.transaction():
+                await connection.execute(LOCK_SQL)
+                await connection.execute(CREATE_VERSION_TABLE)
+                if await connection.fetchval("SELECT exists(SELECT 1 FROM schema_version WHERE version = $1)",
+                                             version):
+                    # applied by a concurrent run while we were waiting for the lock
+                    continue
+                await connection.execute(sql)
+                await connection.execute("INSERT INTO schema_version (version, name) VALUES ($1, $2)",
+                                         version, name)
+            elapsed = time.perf_counter() - started
+            logger.info("Applied migration %s in %.2fs", name, elapsed)
+            applied.append((name, elapsed))
+    finally:
+        await connection.close()
+    return applied
+
+
+async def check_schema():
+    """Проверка версии схемы при запуске: один запрос вместо create_all.
+
+    Если БД недоступна, запуск продолжается: экземпляр не пройдёт /health/ready,
+    пока она не появится. Схема старее последней миграции останавливает запуск.
+    """
+    latest = latest_version()
+    try:
+        async with asyncio.timeout(settings.HEALTH_TIMEOUT):
+            async with engine.connect() as connection:
+                version = await connection.scalar(text("SELECT max(version) FROM schema_version"))
+    except ProgrammingError:
+        # schema_version does not exist: the database was never migrated
+        version = None
+    except (asyncio.TimeoutError, OSError, SQLAlchemyError) as e:
+        logger.warning("Database is unavailable, schema version is not checked: %s", e)
+        return
+    version = version or 0
+    if version < latest:
+        raise RuntimeError(f"Database schema version {version} is older than {latest}, "
+                           f"apply migrations with: python -m db.migrate")
+    if version > latest:
+        logger.warning("Database schema version %d is newer than the application's %d", version, latest)
+
+
+async def _status() -> Tuple[Optional[int], List[str]]:
+    connection = await asyncpg.connect(database_url("postgresql"))
+    try:
+        done = await _applied_versions(connection)
+    finally:
+        await connection.close()
+    return max(done, default=None), [name for version, name in migrations() if version not in done]
+
+
+def main(argv: List[str]):
+    if argv[:1] == ["status"]:
+        current, pending = asyncio.run(_status())
+        print(f"schema version {current if current is not None else 'none'}, latest {latest_version()}")
+        for name in pending:
+            print(f"  pending {name}")
+    elif not argv:
+        applied = asyncio.run(migrate())
+        for name, elapsed in applied:
+            print(f"applied {name} in {elapsed:.2f}s")
+        print(f"schema is at version {latest_version()}" if applied else "schema is up to date")
+    else:
+        sys.exit("usage: python -m db.migrate [status]")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Optional
+
+from fastapi import Depends, Request
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from settings import settings
+from .session import Session, _open_session, _replica_session, get_database, replica_engine
+
+logger = logging.getLogger(__name__)
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# На primary (или реплике, догнавшей поток WAL) отставание считается нулевым,
+# иначе это время с последней применённой транзакции
+LAG_SQL = """
+SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+       END
+"""
+
+
+class ReplicaMonitor:
+    """Фоновая проверка доступности и отставания реплики"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.available = False
+        self.lag: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self):
+        try:
+            async with asyncio.timeout(settings.HEALTH_TIMEOUT):
+                async with self.engine.connect() as connection:
+                    lag = float(await connection.scalar(text(LAG_SQL)) or 0)
+        except (asyncio.TimeoutError, OSError, SQLAlchemyError) as e:
+            if self.available:
+                logger.warning("Read replica is unavailable, reading from primary: %s", e)
+            self.available, self.lag = False, None
+            return
+        available = lag <= settings.DB_REPLICA_MAX_LAG
+        if self.available and not available:
+            logger.warning("Read replica lags %.1fs behind, reading from primary", lag)
+        self.available, self.lag = available, lag
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+monitor = ReplicaMonitor(replica_engine) if replica_engine is not None else None
+
+
+async def start_replica_monitor():
+    if monitor is not None:
+        monitor.start()
+
+
+async def stop_replica_monitor():
+    if monitor is not None:
+        await monitor.stop()
+
+
+def use_replica(request: Request) -> bool:
+    if monitor is None or not monitor.available:
+        return False
+    # the client wrote recently: its own changes may not have reached the replica yet
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) < time.time()
+    except ValueError:
+        return True
+
+
+async def get_read_database(request: Request, db: Session = Depends(get_database)) -> AsyncIterator[Session]:
+    """Сессия для маршрутов, которые только читают.
+
+    Запрос идёт на реплику, если она настроена, доступна и отстаёт не больше
+    DB_REPLICA_MAX_LAG, а клиент ничего не менял последние DB_READ_YOUR_WRITES
+    секунд; иначе используется сессия запроса на primary, та же, что у get_database.
+    """
+    if not use_replica(request):
+        # a second primary session would hold one more pooled connection next to the auth lookup
+        yield db
+        return
+    async with _open_session(_replica_session) as replica:
+        yield replica
+
+
+class ReadYourWritesMiddleware:
+    """Отметка в cookie об успешном изменяющем запросе клиента.
+
+    Пока отметка не истекла, get_read_database читает с primary.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if monitor is None or scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time()) + settings.DB_READ_YOUR_WRITES + 1
+                MutableHeaders(scope=message).append(
+                    "set-cookie", f"{READ_PRIMARY_COOKIE}={until}; Max-Age={settings.DB_READ_YOUR_WRITES + 1}; "
+                                  f"Path=/; HttpOnly; SameSite=Lax")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
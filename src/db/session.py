@@ -1,14 +1,18 @@
 import enum
-import json
+import logging
+import orjson
 
 from datetime import datetime
-from typing import Any, Union
+from typing import Any, AsyncIterator, Optional, Union
+from uuid import uuid4
 from pydantic import BaseModel
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import create_engine
-from contextlib import contextmanager
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession as Session
+from contextlib import asynccontextmanager
 
 from settings import settings
+from metrics import InstrumentedPool
+
+logger = logging.getLogger(__name__)
 
 
 def _json_default(obj: Any) -> Union[str, dict]:
@@ -23,52 +27,87 @@ def _json_default(obj: Any) -> Union[str, dict]:
     raise ValueError(f"Can't serialize {type(obj)}")
 
 
+def json_dumps(obj: Any) -> bytes:
+    # Даты проходят через _json_default, чтобы наивные значения получали часовой пояс
+    return orjson.dumps(obj, default=_json_default,
+                        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+
 def _custom_json_dumps(obj, **kwargs):
-    return json.dumps(obj, **kwargs,
-                      ensure_ascii=False,
-                      allow_nan=False,
-                      indent=None,
-                      separators=(',', ':'),
-                      default=_json_default)
+    return json_dumps(obj).decode()
 
 
-engine = create_engine(
-    "{}://{}:{}@{}:{}/{}".format(
-        "postgresql",
+def database_url(driver: str = "postgresql+asyncpg", addr: Optional[str] = None, port: Optional[int] = None) -> str:
+    return "{}://{}:{}@{}:{}/{}".format(
+        driver,
         settings.DB_USERNAME,
         settings.DB_PASSWORD,
-        settings.DB_ADDR,
-        settings.DB_PORT,
+        addr or settings.DB_ADDR,
+        port or settings.DB_PORT,
         settings.DB_NAME,
-    ), json_serializer=_custom_json_dumps, pool_size=10, pool_timeout=3
-)
+    )
 
-_session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _connect_args() -> dict:
+    if settings.DB_PGBOUNCER:
+        # В режиме transaction соседние транзакции попадают на разные серверные соединения,
+        # поэтому подготовленные выражения не кэшируются и получают уникальные имена.
+        # statement_timeout в этом режиме задаётся на роли: ALTER ROLE ... SET statement_timeout
+        if settings.DB_STATEMENT_TIMEOUT is not None:
+            logger.warning("DB_STATEMENT_TIMEOUT is ignored with DB_PGBOUNCER, set statement_timeout on the role: "
+                           "ALTER ROLE %s SET statement_timeout = %d", settings.DB_USERNAME,
+                           settings.DB_STATEMENT_TIMEOUT)
+        return {"statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"}
+    if settings.DB_STATEMENT_TIMEOUT is not None:
+        return {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT)}}
+    return {}
 
-async def get_database() -> Session:
-    db: Session = _session()
-    try:
-        yield db
-        db.flush()
-        db.commit()
 
-    except:
-        db.rollback()
-        raise
-    finally:
-        db.close()
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        json_serializer=_custom_json_dumps,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=_connect_args(),
+    )
+
+
+engine = _create_engine(database_url())
+# Реплика только для чтения, маршрутизация запросов к ней в db.routing
+replica_engine = (_create_engine(database_url(addr=settings.DB_REPLICA_ADDR, port=settings.DB_REPLICA_PORT))
+                  if settings.DB_REPLICA_ADDR else None)
+
+_session = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+_replica_session = (async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                                       bind=replica_engine)
+                    if replica_engine is not None else None)
+
+
+async def get_database() -> AsyncIterator[Session]:
+    async with _open_session(_session) as db:
+        yield db
 
 
-@contextmanager
 def with_database():
-    db: Session = _session()
+    return _open_session(_session)
+
+
+@asynccontextmanager
+async def _open_session(session_factory: async_sessionmaker) -> AsyncIterator[Session]:
+    db: Session = session_factory()
     try:
         yield db
-        db.flush()
-        db.commit()
+        await db.flush()
+        await db.commit()
     except:
-        db.rollback()
+        await db.rollback()
         raise
     finally:
-        db.close()
+        await db.close()
@@ -0,0 +1,118 @@
+-- Схема на момент перехода с metadata.create_all на миграции.
+-- IF NOT EXISTS позволяет применить миграцию к базе, созданной create_all.
+
+DO $$ BEGIN
+    CREATE TYPE apply_message_type AS ENUM ('inner', 'declarative');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+    CREATE TYPE apply_task_priority AS ENUM ('on_fire', 'urgent', 'high', 'medium', 'low');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE TABLE IF NOT EXISTS unverified_user (
+    email VARCHAR NOT NULL,
+    project_ids INTEGER[] DEFAULT '{}' NOT NULL,
+    PRIMARY KEY (email)
+);
+
+CREATE TABLE IF NOT EXISTS "user" (
+    id SERIAL NOT NULL,
+    username VARCHAR NOT NULL,
+    password VARCHAR NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    telegram_id VARCHAR(16),
+    is_active BOOLEAN DEFAULT 'True' NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (username),
+    UNIQUE (email)
+);
+
+CREATE TABLE IF NOT EXISTS project (
+    id SERIAL NOT NULL,
+    name VARCHAR(64) NOT NULL,
+    icon_id INTEGER DEFAULT '1' NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    created_by INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name),
+    FOREIGN KEY(created_by) REFERENCES "user" (id)
+);
+
+CREATE TABLE IF NOT EXISTS user_info (
+    user_id INTEGER NOT NULL,
+    surname VARCHAR NOT NULL,
+    name VARCHAR NOT NULL,
+    patronymic VARCHAR,
+    phone VARCHAR(16),
+    position VARCHAR(128),
+    joined_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id),
+    FOREIGN KEY(user_id) REFERENCES "user" (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS user_session (
+    id SERIAL NOT NULL,
+    user_id INTEGER NOT NULL,
+    fingerprint VARCHAR NOT NULL,
+    invalid_after TIMESTAMP WITH TIME ZONE NOT NULL,
+    identity VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES "user" (id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS ix_user_session_user_id ON user_session (user_id);
+
+CREATE TABLE IF NOT EXISTS project_section (
+    id SERIAL NOT NULL,
+    project_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name VARCHAR(64) NOT NULL,
+    color INTEGER DEFAULT '1' NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(project_id) REFERENCES project (id)
+);
+CREATE INDEX IF NOT EXISTS ix_project_section_project_id ON project_section (project_id);
+
+CREATE TABLE IF NOT EXISTS project_user (
+    project_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (project_id, user_id),
+    FOREIGN KEY(project_id) REFERENCES project (id),
+    FOREIGN KEY(user_id) REFERENCES "user" (id)
+);
+
+CREATE TABLE IF NOT EXISTS task (
+    id SERIAL NOT NULL,
+    name VARCHAR NOT NULL,
+    description VARCHAR,
+    section_id INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    created_by INTEGER NOT NULL,
+    executor_id INTEGER,
+    priority apply_task_priority DEFAULT 'medium' NOT NULL,
+    deadline TIMESTAMP WITH TIME ZONE,
+    finished BOOLEAN DEFAULT 'False' NOT NULL,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    completion_time INTEGER DEFAULT '0' NOT NULL,
+    tags VARCHAR[],
+    PRIMARY KEY (id),
+    FOREIGN KEY(section_id) REFERENCES project_section (id),
+    FOREIGN KEY(created_by) REFERENCES "user" (id),
+    FOREIGN KEY(executor_id) REFERENCES "user" (id)
+);
+CREATE INDEX IF NOT EXISTS ix_task_section_id ON task (section_id);
+
+CREATE TABLE IF NOT EXISTS task_message (
+    id SERIAL NOT NULL,
+    task_id INTEGER NOT NULL,
+    message_type apply_message_type NOT NULL,
+    text VARCHAR NOT NULL,
+    created_by INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(task_id) REFERENCES task (id),
+    FOREIGN KEY(created_by) REFERENCES "user" (id)
+);
+CREATE INDEX IF NOT EXISTS ix_task_message_task_id ON task_message (task_id);
@@ -0,0 +1,6 @@
+-- Порядок задач на доске и в списке исполнителя, фильтр по тегам
+CREATE INDEX IF NOT EXISTS ix_task_section_order
+    ON task (section_id, priority, coalesce(deadline, 'infinity'::timestamptz), id);
+CREATE INDEX IF NOT EXISTS ix_task_executor_order
+    ON task (executor_id, priority, coalesce(deadline, 'infinity'::timestamptz), id);
+CREATE INDEX IF NOT EXISTS ix_task_tags ON task USING gin (tags);
@@ -0,0 +1,9 @@
+-- Полнотекстовый поиск по задачам и их истории
+ALTER TABLE task ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+                         || setweight(to_tsvector('russian', coalesce(description, '')), 'B')) STORED NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_task_search_vector ON task USING gin (search_vector);
+
+ALTER TABLE task_message ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('russian', text)) STORED NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_task_message_search_vector ON task_message USING gin (search_vector);
@@ -0,0 +1,15 @@
+-- Учёт времени по задаче интервалами работы
+CREATE TABLE IF NOT EXISTS task_time_interval (
+    id SERIAL NOT NULL,
+    task_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    stopped_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (id),
+    FOREIGN KEY(task_id) REFERENCES task (id),
+    FOREIGN KEY(user_id) REFERENCES "user" (id)
+);
+CREATE INDEX IF NOT EXISTS ix_task_time_interval_task ON task_time_interval (task_id, started_at);
+CREATE INDEX IF NOT EXISTS ix_task_time_interval_user ON task_time_interval (user_id, started_at);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_task_time_interval_open
+    ON task_time_interval (task_id, user_id) WHERE stopped_at IS NULL;
@@ -0,0 +1,31 @@
+-- Ручной порядок секций и задач лексикографическими рангами (ranks.py).
+-- Существующие строки получают ранги в том порядке, в котором их показывала доска.
+
+-- Четыре цифры base62 номера строки в группе и средняя цифра V в конце:
+-- ранг не должен заканчиваться нулём, иначе под ним нет места для вставки
+CREATE FUNCTION pg_temp.initial_rank(n bigint) RETURNS varchar LANGUAGE sql IMMUTABLE AS $$
+    SELECT string_agg(substr('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz',
+                             (n / (62 ^ power)::bigint % 62)::int + 1, 1), '' ORDER BY power DESC) || 'V'
+    FROM generate_series(0, 3) AS power
+$$;
+
+ALTER TABLE project_section ADD COLUMN IF NOT EXISTS rank VARCHAR COLLATE "C";
+UPDATE project_section SET rank = ordered.rank
+FROM (SELECT id, pg_temp.initial_rank(row_number() OVER (PARTITION BY project_id ORDER BY position, id)) AS rank
+      FROM project_section
+      WHERE rank IS NULL) ordered
+WHERE project_section.id = ordered.id;
+ALTER TABLE project_section ALTER COLUMN rank SET NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_project_section_rank ON project_section (project_id, rank);
+
+ALTER TABLE task ADD COLUMN IF NOT EXISTS rank VARCHAR COLLATE "C";
+UPDATE task SET rank = ordered.rank
+FROM (SELECT id, pg_temp.initial_rank(row_number() OVER (PARTITION BY section_id
+                                                          ORDER BY priority, coalesce(deadline, 'infinity'::timestamptz), id)) AS rank
+      FROM task
+      WHERE rank IS NULL) ordered
+WHERE task.id = ordered.id;
+ALTER TABLE task ALTER COLUMN rank SET NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_task_section_rank ON task (section_id, rank, id);
+
+DROP FUNCTION pg_temp.initial_rank(bigint);
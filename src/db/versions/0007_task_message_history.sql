@@ -0,0 +1,2 @@
+-- Постраничная история задачи от новых сообщений к старым
+CREATE INDEX IF NOT EXISTS ix_task_message_history ON task_message (task_id, created_at, id);
@@ -0,0 +1,2 @@
+-- Поиск истёкших сессий для фоновой очистки
+CREATE INDEX IF NOT EXISTS ix_user_session_invalid_after ON user_session (invalid_after);
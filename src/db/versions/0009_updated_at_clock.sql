@@ -0,0 +1,3 @@
+-- Время изменения секций и задач берётся в момент изменения, а не в начале транзакции
+ALTER TABLE project_section ALTER COLUMN updated_at SET DEFAULT clock_timestamp();
+ALTER TABLE task ALTER COLUMN updated_at SET DEFAULT clock_timestamp();
@@ -69,3 +69,38 @@ def project_name_is_not_unique():
 def project_not_found():
     return HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                          detail="Project not found!")
+
+
+def task_not_found():
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                         detail="Task not found!")
+
+
+def timer_already_started():
+    return HTTPException(status_code=status.HTTP_409_CONFLICT,
+                         detail="Timer already started!")
+
+
+def timer_not_started():
+    return HTTPException(status_code=status.HTTP_409_CONFLICT,
+                         detail="Timer is not started!")
+
+
+def invalid_cursor():
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                         detail="Invalid cursor")
+
+
+def invalid_import_file():
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                         detail="Import file must be UTF-8 encoded")
+
+
+def invalid_move():
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                         detail="Invalid move target")
+
+
+def duplicate_task_ids():
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                         detail="Task ids in a batch must be unique")
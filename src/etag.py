@@ -0,0 +1,34 @@
+import hashlib
+
+from fastapi import Request, Response, status
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+
+def make_etag(*parts) -> str:
+    """Строгий ETag из версионных данных ресурса"""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def rows_version(id_column, updated_column):
+    """Отпечаток id и времени изменения всех выбранных строк для ETag.
+
+    max(updated_at) не меняется, если транзакция с более ранней отметкой
+    зафиксирована после более поздней; отпечаток меняется при любом изменении строки.
+    """
+    return func.md5(func.string_agg(func.concat(id_column, ":", updated_column),
+                                    aggregate_order_by(literal(","), id_column)))
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set
+
+import asyncpg
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session as SyncSession
+
+from db import Session, database_url
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "board_events"
+# NOTIFY ограничивает полезную нагрузку 8000 байт; длинные списки id заменяются
+# на null, и клиент перечитывает доску целиком
+MAX_EVENT_IDS = 200
+# Пауза перед повторным подключением слушателя, удваивается до RECONNECT_MAX_DELAY
+RECONNECT_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+
+
+class EventHub:
+    """Раздача событий доски подписчикам внутри процесса"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    def dispatch(self, message: Dict[str, Any]):
+        for queue in self._subscribers.get(message["project_id"], ()):
+            if queue.full():
+                # slow consumer: drop the backlog and ask the client to reload the board
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync", "project_id": message["project_id"], "ids": None})
+            else:
+                queue.put_nowait(message)
+
+    def resync_all(self):
+        """Просьба ко всем подписчикам перечитать доски, когда часть событий могла потеряться"""
+        for project_id in list(self._subscribers):
+            self.dispatch({"type": "resync", "project_id": project_id, "ids": None})
+
+    def attach(self, project_id: int, queue: asyncio.Queue):
+        """Подписка очереди на события проекта; очереди достаточно full, empty, get_nowait и put_nowait"""
+        self._subscribers[project_id].add(queue)
+
+    def detach(self, project_id: int, queue: asyncio.Queue):
+        self._subscribers[project_id].discard(queue)
+        if not self._subscribers[project_id]:
+            del self._subscribers[project_id]
+
+    @asynccontextmanager
+    async def subscribe(self, project_id: int) -> AsyncIterator[asyncio.Queue]:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.attach(project_id, queue)
+        try:
+            yield queue
+        finally:
+            self.detach(project_id, queue)
+
+
+hub = EventHub(settings.EVENTS_QUEUE_SIZE)
+
+
+class PostgresListener:
+    """Приём событий других воркеров через LISTEN на отдельном соединении"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._task: Optional[asyncio.Task] = None
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        try:
+            hub.dispatch(json.loads(payload))
+        except (ValueError, KeyError):
+            logger.warning("Malformed board event: %s", payload)
+
+    async def _listen(self):
+        delay = RECONNECT_DELAY
+        interrupted = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(CHANNEL, self._on_notify)
+                if interrupted:
+                    # events published while the listener was away are lost
+                    hub.resync_all()
+                delay = RECONNECT_DELAY
+                await lost.wait()
+                logger.warning("Board events listener connection lost, reconnecting")
+            except Exception as e:
+                logger.warning("Board events listener failed, retrying in %.0fs: %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            finally:
+                if connection is not None:
+                    connection.terminate()
+            interrupted = True
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+listener = PostgresListener(database_url("postgresql", addr=settings.EVENTS_DB_ADDR, port=settings.EVENTS_DB_PORT))
+
+
+async def start_events():
+    if settings.EVENTS_BACKEND != "postgres":
+        return
+    if settings.DB_PGBOUNCER and settings.EVENTS_DB_ADDR is None:
+        raise RuntimeError("EVENTS_BACKEND=postgres needs a direct connection for LISTEN, which does not work "
+                           "through PgBouncer in transaction mode: set EVENTS_DB_ADDR (and EVENTS_DB_PORT) "
+                           "to the PostgreSQL server")
+    listener.start()
+
+
+async def stop_events():
+    await listener.stop()
+
+
+async def publish(db: Session, project_id: int, type: str, ids: Optional[Iterable[int]] = None):
+    """Публикация события доски при фиксации транзакции db.
+
+    С бэкендом postgres используется NOTIFY, который сам доставляется только
+    после COMMIT; в памяти событие откладывается до after_commit сессии.
+    """
+    ids = sorted(ids) if ids is not None else None
+    if ids is not None and len(ids) > MAX_EVENT_IDS:
+        ids = None
+    message = {"type": type, "project_id": project_id, "ids": ids}
+    if settings.EVENTS_BACKEND == "postgres":
+        await db.execute(select(func.pg_notify(CHANNEL, json.dumps(message, separators=(",", ":")))))
+    else:
+        db.sync_session.info.setdefault("board_events", []).append(message)
+
+
+@event.listens_for(SyncSession, "after_commit")
+def _dispatch_pending(session: SyncSession):
+    for message in session.info.pop("board_events", ()):
+        hub.dispatch(message)
+
+
+@event.listens_for(SyncSession, "after_soft_rollback")
+def _drop_pending(session: SyncSession, previous_transaction):
+    session.info.pop("board_events", None)
@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, Literal, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select, or_, text
+
+from db import Session, with_database
+from models.project import ProjectSection
+from models.task import Task
+from models.user import User
+from ranks import append_ranks
+from schemas.task import ImportTaskRow, ImportRowError, ImportTasksResponse
+
+ImportFormat = Literal["ndjson", "csv"]
+
+STAGING_COLUMNS = ["row_num", "section_id", "name", "description", "executor_id", "priority",
+                   "deadline", "finished", "finished_at", "completion_time", "tags", "rank"]
+
+# Временная таблица живёт до конца транзакции, поэтому параллельные импорты не пересекаются
+STAGING_DDL = """
+CREATE TEMPORARY TABLE task_import (
+    row_num integer NOT NULL,
+    section_id integer NOT NULL,
+    name varchar NOT NULL,
+    description varchar,
+    executor_id integer,
+    priority varchar,
+    deadline timestamptz,
+    finished boolean NOT NULL,
+    finished_at timestamptz,
+    completion_time integer NOT NULL,
+    tags varchar[],
+    rank varchar COLLATE "C" NOT NULL
+) ON COMMIT DROP
+"""
+
+MERGE_SQL = """
+INSERT INTO task (section_id, name, description, created_by, executor_id, priority,
+                  deadline, finished, finished_at, completion_time, tags, rank)
+SELECT section_id, name, description, :created_by, executor_id,
+       coalesce(priority, 'medium')::apply_task_priority,
+       deadline, finished, finished_at, completion_time, tags, rank
+FROM task_import
+ORDER BY row_num
+"""
+
+
+def _read_rows(content: str, format: ImportFormat) -> Iterator[Tuple[int, Dict[str, Any] | str]]:
+    """Строки файла импорта: словарь с данными или текст ошибки разбора"""
+    if format == "csv":
+        for row_num, row in enumerate(csv.DictReader(io.StringIO(content)), start=1):
+            data = {key: value for key, value in row.items() if key and value not in (None, "")}
+            if "tags" in data:
+                data["tags"] = [tag.strip() for tag in data["tags"].split(",") if tag.strip()]
+            yield row_num, data
+        return
+    for row_num, line in enumerate(content.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield row_num, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield row_num, "Row must be a JSON object"
+            continue
+        yield row_num, data
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
+
+
+async def import_tasks(db: Session, project_id: int, user_id: int,
+                       content: str, format: ImportFormat) -> ImportTasksResponse:
+    """Массовая загрузка задач проекта через COPY во временную таблицу.
+
+    Строки с ошибками пропускаются и возвращаются в отчёте, остальные
+    вставляются одним INSERT ... SELECT. Фиксация транзакции остаётся
+    за вызывающим кодом.
+    """
+    errors = []
+    rows = []
+    for row_num, data in _read_rows(content, format):
+        if isinstance(data, str):
+            errors.append(ImportRowError(row=row_num, detail=data))
+            continue
+        # history records from an NDJSON export are skipped
+        if data.get("record", "task") != "task":
+            continue
+        try:
+            rows.append((row_num, ImportTaskRow.model_validate(data)))
+        except ValidationError as e:
+            errors.append(ImportRowError(row=row_num, detail=_validation_detail(e)))
+
+    sections = dict((await db.execute(select(ProjectSection.name, ProjectSection.id)
+                                      .filter_by(project_id=project_id))).all())
+    executors = {}
+    identifiers = {row.executor for _, row in rows if row.executor}
+    if identifiers:
+        emails = {identifier.lower() for identifier in identifiers}
+        for user in await db.execute(select(User.id, User.username, User.email)
+                                     .filter(or_(User.username.in_(identifiers), User.email.in_(emails)))):
+            executors[user.username] = user.id
+            executors[user.email] = user.id
+
+    records = []
+    for row_num, row in rows:
+        section_id = sections.get(row.section)
+        if section_id is None:
+            errors.append(ImportRowError(row=row_num, detail=f"Unknown section {row.section!r}"))
+            continue
+        executor_id = None
+        if row.executor:
+            executor_id = executors.get(row.executor, executors.get(row.executor.lower()))
+            if executor_id is None:
+                errors.append(ImportRowError(row=row_num, detail=f"Unknown executor {row.executor!r}"))
+                continue
+        records.append((row_num, section_id, row.name, row.description, executor_id,
+                        str(row.priority) if row.priority else None, row.deadline, row.finished,
+                        row.finished_at, row.completion_time, row.tags))
+
+    if records:
+        # imported tasks are appended to their sections in file order
+        ranks = await append_ranks(db, Task.rank, Task.section_id, Counter(record[1] for record in records))
+        ranks = {section_id: iter(section_ranks) for section_id, section_ranks in ranks.items()}
+        records = [(*record, next(ranks[record[1]])) for record in records]
+        await db.execute(text(STAGING_DDL))
+        connection = await (await db.connection()).get_raw_connection()
+        await connection.driver_connection.copy_records_to_table("task_import",
+                                                                 records=records,
+                                                                 columns=STAGING_COLUMNS)
+        await db.execute(text(MERGE_SQL), {"created_by": user_id})
+
+    errors.sort(key=lambda error: error.row)
+    return ImportTasksResponse(imported=len(records), errors=errors)
+
+
+async def _main(args: argparse.Namespace):
+    with open(args.file, encoding="utf-8") as f:
+        content = f.read()
+    format = args.format or ("csv" if args.file.endswith(".csv") else "ndjson")
+    started = time.perf_counter()
+    async with with_database() as db:
+        result = await import_tasks(db, args.project_id, args.user_id, content, format)
+    elapsed = time.perf_counter() - started
+    for error in result.errors:
+        print(f"row {error.row}: {error.detail}")
+    print(f"imported {result.imported} tasks in {elapsed:.2f}s "
+          f"({result.imported / elapsed:.0f} rows/s), rejected {len(result.errors)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import of project tasks")
+    parser.add_argument("file")
+    parser.add_argument("--project-id", type=int, required=True)
+    parser.add_argument("--user-id", type=int, required=True, help="author of the imported tasks")
+    parser.add_argument("--format", choices=["ndjson", "csv"])
+    asyncio.run(_main(parser.parse_args()))
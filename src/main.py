@@ -1,14 +1,49 @@
+import startup  # первым: от него отсчитывается время импорта приложения
 import uvicorn
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from settings import settings
-from routers import router
-from db import create_tables
+from routers import router, health
+from db.migrate import check_schema
+from db.session import engine, replica_engine
+from db.routing import ReadYourWritesMiddleware, start_replica_monitor, stop_replica_monitor
+from responses import ORJSONResponse
+from passwords import shutdown_password_pool
+from events import start_events, stop_events
+from sweeper import start_session_sweeper, stop_session_sweeper
+from metrics import MetricsMiddleware, instrument_app, instrument_engines, metrics
+import sqlstats
 from fastapi.middleware.cors import CORSMiddleware
 
-create_tables()
-app = FastAPI(debug=settings.SERVER_TEST)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.lifespan_started()
+    await check_schema()
+    await start_events()
+    await start_replica_monitor()
+    await start_session_sweeper()
+    startup.ready()
+    yield
+    await stop_session_sweeper()
+    await stop_replica_monitor()
+    await stop_events()
+    shutdown_password_pool()
+
+
+app = FastAPI(debug=settings.SERVER_TEST, lifespan=lifespan, default_response_class=ORJSONResponse)
 app.include_router(router)
+app.include_router(health)
+app.add_route("/metrics", metrics, include_in_schema=False)
+
+engines = {"primary": engine}
+if replica_engine is not None:
+    engines["replica"] = replica_engine
+instrument_engines(engines)
+for instrumented in engines.values():
+    sqlstats.instrument_engine(instrumented)
+instrument_app()
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,10 +52,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
+startup.imported()
 
 if __name__ == "__main__":
     uvicorn.run(
-        "main:app",
+        # the reloader needs an import string, otherwise the already built app is served
+        # instead of importing and instrumenting it a second time
+        "main:app" if settings.SERVER_TEST else app,
         host=settings.SERVER_ADDR,
         port=settings.SERVER_PORT,
         reload=settings.SERVER_TEST,
@@ -0,0 +1,145 @@
+import time
+from typing import Dict, Iterable
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import startup
+from passwords import pending_hashes
+from sqlstats import track_queries, report
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency",
+                            ["method", "route", "status"],
+                            buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being processed", ["method"])
+REQUEST_QUERIES = Histogram("db_queries_per_request", "SQL statements executed per HTTP request", ["route"],
+                            buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250))
+REQUEST_ROWS = Histogram("db_rows_per_request", "Rows returned or affected per HTTP request", ["route"],
+                         buckets=(0, 1, 10, 100, 1000, 10000, 100000))
+REQUEST_QUERY_TIME = Histogram("db_query_seconds_per_request", "Time spent in SQL per HTTP request", ["route"],
+                               buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+POOL_WAIT = Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection",
+                      buckets=(.001, .005, .01, .05, .1, .25, .5, 1, 2, 3))
+POOL_TIMEOUTS = Counter("db_pool_timeouts", "Connection checkouts that hit pool_timeout")
+SESSIONS_PURGED = Counter("user_sessions_purged", "User sessions removed by the sweeper", ["reason"])
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий ожидание свободного соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+class PoolCollector(Collector):
+    """Состояние пулов соединений; метка pool различает primary и реплику"""
+
+    def __init__(self, engines: Dict[str, AsyncEngine]):
+        self.pools = {name: engine.sync_engine.pool for name, engine in engines.items()}
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        size = GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["pool"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["pool"])
+        checked_in = GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["pool"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections opened above pool_size", labels=["pool"])
+        timeout = GaugeMetricFamily("db_pool_timeout_seconds", "Configured pool_timeout", labels=["pool"])
+        for name, pool in self.pools.items():
+            size.add_metric([name], pool.size())
+            checked_out.add_metric([name], pool.checkedout())
+            checked_in.add_metric([name], pool.checkedin())
+            # QueuePool reports overflow as a negative number until pool_size connections are open
+            overflow.add_metric([name], max(pool.overflow(), 0))
+            timeout.add_metric([name], pool.timeout())
+        yield from (size, checked_out, checked_in, overflow, timeout)
+
+
+class AuthCacheCollector(Collector):
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        # auth зависит от db, который сам импортирует этот модуль
+        from auth import auth_cache_stats
+
+        hits = CounterMetricFamily("auth_cache_hits", "Auth cache hits", labels=["cache"])
+        misses = CounterMetricFamily("auth_cache_misses", "Auth cache misses", labels=["cache"])
+        size = GaugeMetricFamily("auth_cache_size", "Auth cache entries", labels=["cache"])
+        for name, stats in auth_cache_stats().items():
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            size.add_metric([name], stats["size"])
+        yield from (hits, misses, size)
+
+
+class StartupCollector(Collector):
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        phases = GaugeMetricFamily("app_startup_seconds", "Instance startup time by phase", labels=["phase"])
+        for phase, seconds in startup.phases.items():
+            phases.add_metric([phase], seconds)
+        yield phases
+
+
+def instrument_engines(engines: Dict[str, AsyncEngine]):
+    REGISTRY.register(PoolCollector(engines))
+
+
+def instrument_app():
+    REGISTRY.register(AuthCacheCollector())
+    REGISTRY.register(StartupCollector())
+    Gauge("password_hash_queue_depth", "Password hashing jobs queued or running").set_function(pending_hashes)
+
+
+class MetricsMiddleware:
+    """ASGI-обёртка, собирающая задержку и статистику SQL по маршрутам.
+
+    Маршрут берётся из шаблона пути, а не из URL, чтобы число меток
+    не росло вместе с идентификаторами.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        with track_queries(scope) as stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - started
+                in_progress.dec()
+                route = stats.route
+                REQUEST_LATENCY.labels(method, route, status).observe(elapsed)
+                REQUEST_QUERIES.labels(route).observe(stats.queries)
+                REQUEST_ROWS.labels(route).observe(stats.rows)
+                REQUEST_QUERY_TIME.labels(route).observe(stats.duration)
+                report(stats)
+                startup.request_finished(elapsed)
+
+
+async def metrics(request: Request) -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
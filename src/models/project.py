@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, TIMESTAMP, ForeignKey, Boolean, func
+from sqlalchemy import Integer, String, TIMESTAMP, ForeignKey, Boolean, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from models.base import Base
@@ -26,5 +26,14 @@ class ProjectSection(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     project_id: Mapped[int] = mapped_column(Integer, ForeignKey("project.id"), index=True)
     position: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Порядок секций на доске, см. ranks.py
+    rank: Mapped[str] = mapped_column(String(collation="C"), nullable=False)
     name: Mapped[str] = mapped_column(String(64), nullable=False)
     color: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+    # clock_timestamp, а не время начала транзакции: отметка для ETag берётся в момент изменения
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False,
+                                                 server_default=func.clock_timestamp(),
+                                                 onupdate=func.clock_timestamp())
+
+
+Index("ix_project_section_rank", ProjectSection.project_id, ProjectSection.rank)
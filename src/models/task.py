@@ -1,11 +1,14 @@
-from sqlalchemy import Integer, String, TIMESTAMP, ForeignKey, Boolean, func
+from sqlalchemy import Integer, String, TIMESTAMP, ForeignKey, Boolean, Computed, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from models.base import Base, apply_message_type, apply_task_priority
 from schemas.enums import EnumMessageType, EnumTaskPriority
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from typing import List
 
+# Конфигурация полнотекстового поиска, должна совпадать в индексах и запросах
+SEARCH_CONFIG = "russian"
+
 
 class Task(Base):
     __tablename__ = 'task'
@@ -15,6 +18,10 @@ class Task(Base):
     section_id: Mapped[int] = mapped_column(Integer, ForeignKey('project_section.id'), nullable=False, index=True)
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False,
                                                  server_default=func.current_timestamp())
+    # clock_timestamp, а не время начала транзакции: отметка для ETag берётся в момент изменения
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False,
+                                                 server_default=func.clock_timestamp(),
+                                                 onupdate=func.clock_timestamp())
     created_by: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
     executor_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=True)
     priority: Mapped[EnumTaskPriority] = mapped_column(apply_task_priority, nullable=False,
@@ -24,6 +31,29 @@ class Task(Base):
     finished_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
     completion_time: Mapped[int] = mapped_column(nullable=False, server_default="0")
     tags: Mapped[List[str]] = mapped_column(ARRAY(String), nullable=True)
+    # Порядок задач внутри секции, см. ranks.py
+    rank: Mapped[str] = mapped_column(String(collation="C"), nullable=False)
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+                 f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+                 persisted=True),
+        deferred=True
+    )
+
+
+# Задачи без дедлайна сортируются последними: NULL заменяется на 'infinity',
+# чтобы ключ сортировки можно было сравнивать кортежем и обслуживать индексом
+task_deadline_key = func.coalesce(Task.deadline, text("'infinity'::timestamptz"))
+
+# Постраничный список задач проекта начинает ключ порядка с section_id, поэтому и весь проект,
+# и одна секция читаются по ix_task_section_order (или ix_task_section_rank) от курсора;
+# ix_task_executor_order находит задачи одного исполнителя для фильтра executor_id
+Index("ix_task_section_order", Task.section_id, Task.priority, task_deadline_key, Task.id)
+Index("ix_task_section_rank", Task.section_id, Task.rank, Task.id)
+Index("ix_task_executor_order", Task.executor_id, Task.priority, task_deadline_key, Task.id)
+Index("ix_task_search_vector", Task.search_vector, postgresql_using="gin")
+Index("ix_task_tags", Task.tags, postgresql_using="gin")
 
 
 class TaskMessage(Base):
@@ -36,3 +66,29 @@ class TaskMessage(Base):
     created_by: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False,
                                                  server_default=func.current_timestamp())
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{SEARCH_CONFIG}', text)", persisted=True),
+        deferred=True
+    )
+
+
+Index("ix_task_message_history", TaskMessage.task_id, TaskMessage.created_at, TaskMessage.id)
+Index("ix_task_message_search_vector", TaskMessage.search_vector, postgresql_using="gin")
+
+
+class TaskTimeInterval(Base):
+    __tablename__ = 'task_time_interval'
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("task.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
+    started_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False,
+                                                 server_default=func.current_timestamp())
+    stopped_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+
+
+# Не более одного открытого интервала на пользователя и задачу
+Index("ux_task_time_interval_open", TaskTimeInterval.task_id, TaskTimeInterval.user_id,
+      unique=True, postgresql_where=TaskTimeInterval.stopped_at.is_(None))
+Index("ix_task_time_interval_task", TaskTimeInterval.task_id, TaskTimeInterval.started_at)
+Index("ix_task_time_interval_user", TaskTimeInterval.user_id, TaskTimeInterval.started_at)
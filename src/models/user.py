@@ -1,5 +1,4 @@
-from passlib.context import CryptContext
-from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy import String, TIMESTAMP, ForeignKey, Boolean, func, ARRAY, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
@@ -7,8 +6,6 @@ from typing import List
 
 from models.base import Base
 
-pwd_context = CryptContext(schemes=["sha256_crypt"])
-
 
 class User(Base):
     __tablename__ = "user"
@@ -20,19 +17,16 @@ class User(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, server_default="True")
 
     user_info: Mapped[List["UserInfo"]] = relationship(back_populates="user", uselist=False, passive_deletes=True)
-    sessions: Mapped["UserSession"] = relationship(back_populates="user", uselist=True, passive_deletes=True)
+    sessions: Mapped[List["UserSession"]] = relationship(back_populates="user", uselist=True, passive_deletes=True)
 
+    # Хеширование и проверка блокируют поток, поэтому модель хранит только готовый хеш;
+    # пароли хешируются и проверяются через passwords.hash_password и passwords.verify_password
     @hybrid_property
     def password(self):
         return self.__password
 
-    @password.setter
-    def password(self, password):
-        self.__password = pwd_context.hash(password)
-
-    @hybrid_method
-    def verify_password(self, password):
-        return pwd_context.verify(password, self.__password)
+    def set_password_hash(self, password_hash):
+        self.__password = password_hash
 
 
 class UnverifiedUser(Base):
@@ -47,10 +41,10 @@ class UserSession(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete='CASCADE'),
                                          nullable=False, index=True)
     fingerprint: Mapped[str] = mapped_column(nullable=False)
-    invalid_after: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    invalid_after: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False, index=True)
     identity: Mapped[str] = mapped_column(nullable=False)
 
-    user: Mapped["User"] = relationship(back_populates="sessions", passive_deletes=True, uselist=True)
+    user: Mapped["User"] = relationship(back_populates="sessions", passive_deletes=True, uselist=False)
 
 
 class UserInfo(Base):
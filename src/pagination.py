@@ -0,0 +1,22 @@
+import base64
+import json
+from typing import Any, List
+
+import errors
+
+
+def encode_cursor(*keys: Any) -> str:
+    """Упаковка ключей последней записи страницы в непрозрачный курсор"""
+    raw = json.dumps(keys, ensure_ascii=False, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Распаковка курсора, полученного от клиента"""
+    try:
+        keys = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise errors.invalid_cursor()
+    if not isinstance(keys, list) or len(keys) != size:
+        raise errors.invalid_cursor()
+    return keys
@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import errors
+from settings import settings
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+@lru_cache(maxsize=None)
+def password_context() -> "CryptContext":
+    """Контекст passlib создаётся при первом хешировании, а не при импорте.
+
+    Импорт passlib и загрузка бэкенда схемы не задерживают запуск экземпляра,
+    а в процессах пула воркеров контекст создаётся один раз на процесс.
+    """
+    from passlib.context import CryptContext
+
+    schemes = [settings.PASSWORD_SCHEME]
+    if settings.PASSWORD_SCHEME != "sha256_crypt":
+        # Старые хеши продолжают проверяться и перехешируются при входе
+        schemes.append("sha256_crypt")
+    options = {}
+    if settings.PASSWORD_ROUNDS is not None:
+        options[f"{settings.PASSWORD_SCHEME}__default_rounds"] = settings.PASSWORD_ROUNDS
+        options[f"{settings.PASSWORD_SCHEME}__min_rounds"] = settings.PASSWORD_ROUNDS
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
+
+_executor: Optional[Executor] = None
+_pending = 0
+
+
+def _hash(password: str) -> str:
+    return password_context().hash(password)
+
+
+def _verify_and_update(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    return password_context().verify_and_update(password, password_hash)
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if settings.PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS,
+                                           thread_name_prefix="password-hash")
+    return _executor
+
+
+async def _run(func, *args):
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_QUEUE:
+        raise errors.server_overloaded()
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    """Хеширование пароля в пуле воркеров"""
+    return await _run(_hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """Проверка пароля в пуле воркеров.
+
+    Вторым элементом возвращается новый хеш, если сохранённый построен
+    на устаревших параметрах, иначе None.
+    """
+    return await _run(_verify_and_update, password, password_hash)
+
+
+def pending_hashes() -> int:
+    return _pending
+
+
+def shutdown_password_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,28 @@
+"""Фикстура pytest для проверки бюджета SQL-запросов.
+
+Подключается через ``-p pytest_sqlstats`` или ``pytest_plugins = ["pytest_sqlstats"]``::
+
+    def test_get_task(client, query_budget):
+        with query_budget():
+            client.get("/api/task/1")
+
+Без аргумента каждый запрос сверяется с бюджетом, объявленным через
+sqlstats.query_budget на обработчике, иначе с переданным числом.
+"""
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+import pytest
+
+from sqlstats import QueryStats, check_budget, collect_requests
+
+
+@pytest.fixture
+def query_budget() -> Callable:
+    @contextmanager
+    def budget(limit: Optional[int] = None) -> Iterator[List[QueryStats]]:
+        with collect_requests() as requests:
+            yield requests
+        for stats in requests:
+            check_budget(stats, limit)
+    return budget
@@ -0,0 +1,111 @@
+"""Лексикографические ранги для ручного порядка секций и задач.
+
+Ранг — строка из цифр base62, упорядоченных по ASCII, и сравнивается как
+дробь 0.<ранг>. Между любыми двумя рангами всегда есть третий, поэтому
+перемещение элемента меняет одну строку. В БД колонки рангов используют
+COLLATE "C", чтобы порядок совпадал с побайтовым сравнением.
+"""
+import logging
+import string
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update, values, column, func
+
+from db import Session, with_database
+
+logger = logging.getLogger(__name__)
+
+DIGITS = string.digits + string.ascii_uppercase + string.ascii_lowercase
+BASE = len(DIGITS)
+# Ранги длиннее этого порога перераспределяются в фоне
+MAX_RANK_LENGTH = 24
+
+
+def rank_between(before: Optional[str], after: Optional[str]) -> str:
+    """Ранг строго между before и after; None означает начало или конец списка"""
+    before = before or ""
+    if after is not None and before >= after:
+        raise ValueError(f"Rank {before!r} is not less than {after!r}")
+    result = []
+    position = 0
+    while True:
+        low = DIGITS.index(before[position]) if position < len(before) else 0
+        if after is not None and position >= len(after):
+            raise ValueError(f"Rank {after!r} ends with {DIGITS[0]!r}")
+        high = DIGITS.index(after[position]) if after is not None else BASE
+        if high - low > 1:
+            result.append(DIGITS[(low + high) // 2])
+            return "".join(result)
+        result.append(DIGITS[low])
+        if high - low == 1:
+            # the prefix is already below after, the rest only has to exceed before
+            after = None
+        position += 1
+
+
+def ranks_between(before: Optional[str], after: Optional[str], count: int) -> List[str]:
+    """count возрастающих рангов между before и after.
+
+    Все ранги имеют общий префикс rank_between(before, after), поэтому их длина
+    растёт логарифмически от count, а не линейно, как при последовательных вставках.
+    """
+    prefix = rank_between(before, after)
+    return [prefix + suffix for suffix in even_ranks(count)]
+
+
+def even_ranks(count: int) -> List[str]:
+    """count равномерно распределённых рангов одинаковой разрядности"""
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    ranks = []
+    for i in range(1, count + 1):
+        value = i * BASE ** width // (count + 1)
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        # trailing zeros keep the order but leave no room below the rank
+        ranks.append("".join(reversed(digits)).rstrip(DIGITS[0]))
+    return ranks
+
+
+async def append_ranks(db: Session, rank_column, group_column, counts: Dict[int, int]) -> Dict[int, List[str]]:
+    """Ранги для counts[group] новых строк в конце каждой группы"""
+    last = dict((await db.execute(select(group_column, func.max(rank_column))
+                                  .filter(group_column.in_(counts))
+                                  .group_by(group_column))).all())
+    return {group: [rank_between(last.get(group), None)] if count == 1 else ranks_between(last.get(group), None, count)
+            for group, count in counts.items()}
+
+
+async def neighbour_rank(db: Session, rank_column, group_filter, rank: str, below: bool,
+                         exclude_filter) -> Optional[str]:
+    """Ближайший ранг соседа снизу или сверху от rank в группе"""
+    query = select(rank_column).filter(group_filter, exclude_filter)
+    if below:
+        query = query.filter(rank_column < rank).order_by(rank_column.desc())
+    else:
+        query = query.filter(rank_column > rank).order_by(rank_column)
+    return await db.scalar(query.limit(1))
+
+
+async def rebalance(model, **filters):
+    """Перераспределение рангов группы строк (секции проекта или задачи секции).
+
+    Выполняется в отдельной транзакции, обычно как фоновая задача после
+    перемещения, которое дало слишком длинный ранг.
+    """
+    async with with_database() as db:
+        ids = (await db.scalars(select(model.id).filter_by(**filters)
+                                .order_by(model.rank, model.id)
+                                .with_for_update())).all()
+        if not ids:
+            return
+        changes = values(column("id", model.id.type), column("rank", model.rank.type),
+                         name="changes").data(list(zip(ids, even_ranks(len(ids)))))
+        await db.execute(update(model)
+                         .where(model.id == changes.c.id)
+                         .values(rank=changes.c.rank)
+                         .execution_options(synchronize_session=False))
+    logger.info("Rebalanced %d %s ranks for %s", len(ids), model.__tablename__, filters)
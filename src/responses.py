@@ -0,0 +1,22 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+from db import json_dumps
+
+
+class ORJSONResponse(JSONResponse):
+    """Ответ по умолчанию: orjson с теми же правилами, что и для JSON-столбцов"""
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
+
+def model_response(adapter: TypeAdapter, data: Any, **kwargs) -> Response:
+    """Однократная валидация данных и сериализация сразу в байты.
+
+    Возвращённый Response FastAPI не валидирует и не кодирует повторно.
+    """
+    return Response(adapter.dump_json(adapter.validate_python(data)),
+                    media_type="application/json", **kwargs)
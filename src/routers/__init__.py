@@ -4,6 +4,7 @@ from .project import router as project_router
 from .task import router as task_router
 from .user import router as user_router
 from .section import router as section_router
+from .health import router as health_router
 
 router = APIRouter(prefix="/api")
 router.include_router(auth_router, prefix="/auth", tags=["Auth"])
@@ -11,3 +12,7 @@ router.include_router(project_router, prefix="/project", tags=["Project"])
 router.include_router(task_router, prefix="/task", tags=["Task"])
 router.include_router(user_router, prefix="/user", tags=["User"])
 router.include_router(section_router, prefix="/sections", tags=["Sections"])
+
+# Пробы оркестратора живут вне /api
+health = APIRouter(prefix="/health", tags=["Health"])
+health.include_router(health_router)
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, Request, Response, Body, Cookie, status
 from sqlalchemy.orm import undefer_group
-from sqlalchemy import or_
+from sqlalchemy import or_, select
 
 import errors
-from auth import get_user_session, init_user_tokens, refresh_user_tokens
+from auth import get_user_session, init_user_tokens, refresh_user_tokens, invalidate_session, invalidate_user
 from db import Session, get_database
 from models.user import User, UserInfo, UnverifiedUser
 from models.project import ProjectUsers
+from passwords import hash_password, verify_password
 from schemas.auth import Refresh, AccountCredentials, SignUpCredentials
 
 router = APIRouter()
@@ -14,27 +15,31 @@ router = APIRouter()
 
 @router.post("/login",
              response_model=Refresh,
-             responses=errors.with_errors(errors.invalid_credentials()
-))
+             responses=errors.with_errors(errors.invalid_credentials(),
+                                          errors.server_overloaded()))
 async def login(
         request: Request,
         response: Response,
         credentials: AccountCredentials,
         db: Session = Depends(get_database)
 ):
-    user: User | None = (db.query(User).options(undefer_group("sensitive"))
-                         .filter(or_(User.email == credentials.login.lower(),
-                                     User.username == credentials.login))
-                         .first())
+    user: User | None = await db.scalar(select(User).options(undefer_group("sensitive"))
+                                        .filter(or_(User.email == credentials.login.lower(),
+                                                    User.username == credentials.login))
+                                        .limit(1))
     if user is None:
         raise errors.invalid_credentials()
-    if not user.verify_password(credentials.password):
+    valid, new_hash = await verify_password(credentials.password, user.password)
+    if not valid:
         raise errors.invalid_credentials()
-    return init_user_tokens(user,
-                            credentials.remember_me,
-                            request,
-                            response,
-                            db)
+    if new_hash is not None:
+        user.set_password_hash(new_hash)
+        invalidate_user(user.id)
+    return await init_user_tokens(user,
+                                  credentials.remember_me,
+                                  request,
+                                  response,
+                                  db)
 
 
 @router.post("/refresh",
@@ -47,7 +52,7 @@ async def refresh_token(request: Request,
                         access: str = Cookie(None),
                         params: Refresh = Body(),
                         db: Session = Depends(get_database)):
-    return refresh_user_tokens(access, params.refresh, request, response, db)
+    return await refresh_user_tokens(access, params.refresh, request, response, db)
 
 
 @router.delete("/logout", status_code=status.HTTP_204_NO_CONTENT,
@@ -58,44 +63,47 @@ async def logout_user(response: Response,
                       session=Depends(get_user_session),
                       db: Session = Depends(get_database)):
     response.delete_cookie(key="access")
-    db.delete(session)
-    db.commit()
+    invalidate_session(session)
+    await db.delete(session)
+    await db.commit()
 
 
 @router.post("/signup",
              status_code=201,
              responses=errors.with_errors(errors.password_too_weak(),
-                                          errors.auth_data_is_not_unique()))
+                                          errors.auth_data_is_not_unique(),
+                                          errors.server_overloaded()))
 async def sign_up(credentials: SignUpCredentials,
                   db: Session = Depends(get_database)):
     # check password length
     if len(credentials.password) < 5:
         raise errors.password_too_weak()
     # check if username and email is unique
-    credentials_check = db.query(User).filter(or_(User.email == credentials.email.lower(),
-                                                  User.username == credentials.username)).first()
+    credentials_check = await db.scalar(select(User).filter(or_(User.email == credentials.email.lower(),
+                                                                User.username == credentials.username)).limit(1))
     if credentials_check is not None:
         raise errors.auth_data_is_not_unique()
+    password_hash = await hash_password(credentials.password)
     # Inserting base and additional user data in db
     try:
         base_info = User(username=credentials.username,
-                         password=credentials.password,
                          email=credentials.email)
+        base_info.set_password_hash(password_hash)
         db.add(base_info)
-        db.flush()
+        await db.flush()
         additional_info = UserInfo(user_id=base_info.id,
                                    surname=credentials.surname,
                                    name=credentials.name)
         db.add(additional_info)
-        db.commit()
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
 
     # If user was invited to projects before signup, then add user to projects
-    unverified_data = db.query(UnverifiedUser).filter_by(email=credentials.email).first()
+    unverified_data = await db.scalar(select(UnverifiedUser).filter_by(email=credentials.email).limit(1))
     if unverified_data is not None:
         for project_id in unverified_data.project_ids:
             db.add(ProjectUsers(project_id=project_id,
                                 user_id=base_info.id))
-        db.delete(unverified_data)
-        db.commit()
+        await db.delete(unverified_data)
+        await db.commit()
@@ -0,0 +1,59 @@
+import asyncio
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Response, status
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db.session import engine, replica_engine
+from schemas.health import HealthStatus, PoolStatus
+from settings import settings
+
+router = APIRouter()
+
+
+def _pool_status(engine: AsyncEngine) -> PoolStatus:
+    pool = engine.sync_engine.pool
+    checked_out = pool.checkedout()
+    # pool_size=0 or max_overflow=-1 lift the limit on connections: such a pool never saturates
+    unlimited = pool.size() <= 0 or settings.DB_POOL_MAX_OVERFLOW < 0
+    # overflow() is negative until pool_size connections have been opened
+    return PoolStatus(size=pool.size(),
+                      max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+                      checked_out=checked_out,
+                      overflow=max(pool.overflow(), 0),
+                      saturation=(0.0 if unlimited
+                                  else round(checked_out / (pool.size() + settings.DB_POOL_MAX_OVERFLOW), 3)))
+
+
+def _replica_pool_status() -> Optional[PoolStatus]:
+    return _pool_status(replica_engine) if replica_engine is not None else None
+
+
+@router.get("/live", response_model=HealthStatus)
+async def live():
+    """Процесс отвечает; БД не проверяется, чтобы её сбой не вызывал перезапуск"""
+    return HealthStatus(status="ok")
+
+
+@router.get("/ready", response_model=HealthStatus)
+async def ready(response: Response):
+    """Готовность принимать трафик: соединение из пула и круг до БД за HEALTH_TIMEOUT.
+
+    Исчерпанный пул не отдаёт соединение за отведённое время, и экземпляр
+    выводится из балансировки до освобождения соединений.
+    """
+    started = time.perf_counter()
+    try:
+        async with asyncio.timeout(settings.HEALTH_TIMEOUT):
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+    except (asyncio.TimeoutError, OSError, SQLAlchemyError):
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return HealthStatus(status="unavailable", pool=_pool_status(engine), replica_pool=_replica_pool_status())
+    return HealthStatus(status="ok",
+                        database_latency_ms=round((time.perf_counter() - started) * 1000, 2),
+                        pool=_pool_status(engine),
+                        replica_pool=_replica_pool_status())
@@ -1,21 +1,36 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import or_, and_
-from typing import List
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, and_, select, delete
+from sqlalchemy.orm import joinedload
+from typing import List, Literal, AsyncIterator, Dict, Any
+from collections import defaultdict
+import asyncio
+import csv
+import io
+import json
 
 from models.project import Project, ProjectUsers, ProjectSection
-from models.task import Task, TaskMessage
+from models.task import Task, TaskMessage, TaskTimeInterval
 from models.user import User
 from schemas.project import (ProjectCreate, ProjectCreateResponse, ProjectUpdate,
                              RemoveUserFromProject, UserInProject, ProjectBaseInfo,
                              GetProject, SectionsInProject, AddUserToProject)
-from db import get_database, Session
+from db import get_database, get_read_database, with_database, Session
 from auth import get_user
+from etag import make_etag, etag_matches, not_modified, rows_version
+from responses import model_response
+from events import hub, publish
+from sqlstats import query_budget
+from ranks import even_ranks
+from pydantic import TypeAdapter
 from datetime import datetime, timezone
 
 import errors
 
 router = APIRouter()
 
+project_list_adapter = TypeAdapter(List[ProjectBaseInfo])
+
 
 @router.post("/",
              response_model=ProjectCreateResponse,
@@ -23,34 +38,39 @@ router = APIRouter()
 async def create_project(project_data: ProjectCreate,
                          user: User = Depends(get_user),
                          db: Session = Depends(get_database)):
-    unique_project_name_check = db.query(Project).filter(Project.name == project_data.name).first()
+    unique_project_name_check = await db.scalar(select(Project).filter(Project.name == project_data.name).limit(1))
     if unique_project_name_check is not None:
         raise errors.project_name_is_not_unique()
     project = Project(name=project_data.name,
                       created_by=user.id,
                       icon_id=1 if project_data.icon_id is None else project_data.icon_id)
     db.add(project)
-    db.commit()
+    await db.commit()
     db.add(ProjectUsers(project_id=project.id,
                         user_id=user.id))
-    db.commit()
+    await db.commit()
+    ranks = even_ranks(4)
     backlog_section = ProjectSection(project_id=project.id,
                                      name="Беклог",
-                                     position=1)
+                                     position=1,
+                                     rank=ranks[0])
     db.add(backlog_section)
     to_do = ProjectSection(project_id=project.id,
                            name="Надо сделать",
-                           position=2)
+                           position=2,
+                           rank=ranks[1])
     db.add(to_do)
     in_work = ProjectSection(project_id=project.id,
                              name="В работе",
-                             position=3)
+                             position=3,
+                             rank=ranks[2])
     db.add(in_work)
     closed = ProjectSection(project_id=project.id,
                             name="Закрыта",
-                            position=4)
+                            position=4,
+                            rank=ranks[3])
     db.add(closed)
-    db.commit()
+    await db.commit()
     return ProjectCreateResponse(project_id=project.id)
 
 
@@ -61,33 +81,22 @@ async def create_project(project_data: ProjectCreate,
 async def delete_project(project_id: int,
                          user: User = Depends(get_user),
                          db: Session = Depends(get_database)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.scalar(select(Project).filter(Project.id == project_id).limit(1))
     if project is None:
         raise errors.project_not_found()
     if project.created_by != user.id:
         raise errors.access_denied()
-    project_users = db.query(ProjectUsers).filter(ProjectUsers.project_id == project_id).all()
-    for project_user in project_users:
-        db.delete(project_user)
-    db.flush()
-    sections = db.query(ProjectSection).filter(ProjectSection.project_id == project_id).all()
-    tasks = db.query(Task).filter(Task.section_id.in_([section.id for section in sections])).all()
-    tasks_messages = db.query(TaskMessage).filter(TaskMessage.task_id.in_([task.id for task in tasks])).all()
-
-    for message in tasks_messages:
-        db.delete(message)
-    db.flush()
-
-    for task in tasks:
-        db.delete(task)
-    db.flush()
-
-    for section in sections:
-        db.delete(section)
-    db.flush()
-
-    db.delete(project)
-    db.commit()
+    sections_q = select(ProjectSection.id).filter(ProjectSection.project_id == project_id)
+    tasks_q = select(Task.id).filter(Task.section_id.in_(sections_q))
+    for statement in (delete(TaskMessage).filter(TaskMessage.task_id.in_(tasks_q)),
+                      delete(TaskTimeInterval).filter(TaskTimeInterval.task_id.in_(tasks_q)),
+                      delete(Task).filter(Task.section_id.in_(sections_q)),
+                      delete(ProjectSection).filter(ProjectSection.project_id == project_id),
+                      delete(ProjectUsers).filter(ProjectUsers.project_id == project_id),
+                      delete(Project).filter(Project.id == project_id)):
+        await db.execute(statement.execution_options(synchronize_session=False))
+    await publish(db, project_id, "project.deleted")
+    await db.commit()
 
 
 @router.get("/{project_id}",
@@ -95,16 +104,27 @@ async def delete_project(project_id: int,
             responses=errors.with_errors(errors.project_not_found(),
                                          errors.access_denied()))
 async def get_project(project_id: int,
+                      request: Request,
+                      response: Response,
                       user: User = Depends(get_user),
-                      db: Session = Depends(get_database)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+                      db: Session = Depends(get_read_database)):
+    project = await db.scalar(select(Project).filter(Project.id == project_id).limit(1))
     if project is None:
         raise errors.project_not_found()
-    if db.query(ProjectUsers).filter_by(project_id=project_id,
-                                        user_id=user.id).first() is None:
+    if await db.scalar(select(ProjectUsers).filter_by(project_id=project_id,
+                                                      user_id=user.id).limit(1)) is None:
         raise errors.access_denied()
 
-    project_sections = db.query(ProjectSection).filter(ProjectSection.project_id == project_id).all()
+    sections_version = await db.scalar(select(rows_version(ProjectSection.id, ProjectSection.updated_at))
+                                       .filter(ProjectSection.project_id == project_id))
+    etag = make_etag(project.id, project.updated_at or project.created_at, sections_version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    project_sections = (await db.scalars(select(ProjectSection)
+                                         .filter(ProjectSection.project_id == project_id)
+                                         .order_by(ProjectSection.rank, ProjectSection.id))).all()
 
     return GetProject(project_id=project.id,
                       name=project.name,
@@ -124,7 +144,7 @@ async def update_project(project_id: int,
                          update_data: ProjectUpdate,
                          user: User = Depends(get_user),
                          db: Session = Depends(get_database)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.scalar(select(Project).filter(Project.id == project_id).limit(1))
     if project is None:
         raise errors.project_not_found()
     if project.created_by != user.id:
@@ -137,42 +157,51 @@ async def update_project(project_id: int,
 
     project.updated_at = datetime.now(tz=timezone.utc)
 
-    db.commit()
+    await publish(db, project_id, "project.updated")
+    await db.commit()
 
 
 @router.get("/all/",
             response_model=List[ProjectBaseInfo],
             responses=errors.with_errors())
+@query_budget(3)
 async def get_all_projects(user: User = Depends(get_user),
-                           db: Session = Depends(get_database)):
-    projects = (db.query(ProjectUsers, Project)
-                .filter(ProjectUsers.user_id == user.id)
-                .join(Project, ProjectUsers.project_id == Project.id)
-                .all())
-
-    result = []
-    for project in projects:
-        sections = db.query(ProjectSection).filter(ProjectSection.project_id == project[0].project_id).all()
-        result.append(ProjectBaseInfo(project_id=project[1].id,
-                                      icon_id=project[1].icon_id,
-                                      name=project[1].name,
-                                      section_ids=[SectionsInProject(section_id=section.id,
-                                                                     name=section.name,
-                                                                     position=section.position) for section in sections]))
-    return result
+                           db: Session = Depends(get_read_database)):
+    user_projects = select(ProjectUsers.project_id).filter(ProjectUsers.user_id == user.id)
+    projects = (await db.execute(select(Project.id, Project.icon_id, Project.name)
+                                 .filter(Project.id.in_(user_projects))
+                                 .order_by(Project.id))).all()
+    sections = await db.execute(select(ProjectSection.project_id, ProjectSection.id,
+                                       ProjectSection.name, ProjectSection.position)
+                                .filter(ProjectSection.project_id.in_(user_projects))
+                                .order_by(ProjectSection.project_id, ProjectSection.rank, ProjectSection.id))
+
+    project_sections = defaultdict(list)
+    for section in sections:
+        project_sections[section.project_id].append({"section_id": section.id,
+                                                     "name": section.name,
+                                                     "position": section.position})
+    return model_response(project_list_adapter,
+                          [{"project_id": project.id,
+                            "icon_id": project.icon_id,
+                            "name": project.name,
+                            "section_ids": project_sections[project.id]}
+                           for project in projects])
 
 
 @router.get("/{project_id}/users",
             response_model=List[UserInProject],
             responses=errors.with_errors(errors.project_not_found()))
+@query_budget(3)
 async def get_project_users(project_id: int,
                             user: User = Depends(get_user),
-                            db: Session = Depends(get_database)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+                            db: Session = Depends(get_read_database)):
+    project = await db.scalar(select(Project).filter(Project.id == project_id).limit(1))
     if project is None:
         raise errors.project_not_found()
-    project_users = (db.query(ProjectUsers, User).filter(ProjectUsers.project_id == project.id).
-                     join(User, ProjectUsers.user_id == User.id).all())
+    project_users = (await db.execute(select(ProjectUsers, User).filter(ProjectUsers.project_id == project.id)
+                                      .join(User, ProjectUsers.user_id == User.id)
+                                      .options(joinedload(User.user_info)))).all()
 
     return [UserInProject(user_id=project_user[0].user_id,
                           name=project_user[1].user_info.name,
@@ -190,19 +219,21 @@ async def add_users_to_project(project_id: int,
                                data: AddUserToProject,
                                user: User = Depends(get_user),
                                db: Session = Depends(get_database)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.scalar(select(Project).filter(Project.id == project_id).limit(1))
     if project is None:
         raise errors.project_not_found()
-    current_project_users = [project_user.user_id for project_user in
-                             db.query(ProjectUsers).filter(ProjectUsers.project_id == project.id).all()]
-    users = db.query(User).filter(and_(or_(User.email.in_(data.user_identification),
-                                           User.username.in_(data.user_identification)
-                                           ),
-                                       User.id.notin_(current_project_users))).all()
+    current_project_users = (await db.scalars(select(ProjectUsers.user_id)
+                                              .filter(ProjectUsers.project_id == project.id))).all()
+    users = (await db.scalars(select(User).filter(and_(or_(User.email.in_(data.user_identification),
+                                                           User.username.in_(data.user_identification)
+                                                           ),
+                                                       User.id.notin_(current_project_users))))).all()
     for project_user in users:
         db.add(ProjectUsers(user_id=project_user.id,
                             project_id=project.id))
-    db.commit()
+    if users:
+        await publish(db, project.id, "members.updated", [project_user.id for project_user in users])
+    await db.commit()
 
 
 @router.delete("/{project_id}/users/remove",
@@ -212,13 +243,145 @@ async def remove_users_from_project(project_id: int,
                                     data: RemoveUserFromProject,
                                     user: User = Depends(get_user),
                                     db: Session = Depends(get_database)):
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.scalar(select(Project).filter(Project.id == project_id).limit(1))
     if project is None:
         raise errors.project_not_found()
     if project.created_by != user.id:
         raise errors.access_denied()
 
-    users_for_removal = db.query(ProjectUsers).filter(ProjectUsers.user_id.in_(data.user_ids)).all()
+    users_for_removal = (await db.scalars(select(ProjectUsers)
+                                          .filter(ProjectUsers.project_id == project.id,
+                                                  ProjectUsers.user_id.in_(data.user_ids)))).all()
     for rm_user in users_for_removal:
-        db.delete(rm_user)
-    db.commit()
+        await db.delete(rm_user)
+    if users_for_removal:
+        await publish(db, project.id, "members.updated", [rm_user.user_id for rm_user in users_for_removal])
+    await db.commit()
+
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CSV_FIELDS = ["record", "task_id", "section", "name", "description", "priority", "deadline",
+                     "finished", "finished_at", "completion_time", "tags", "executor_id",
+                     "message_type", "text", "created_by", "created_at"]
+
+
+async def _export_records(project_id: int, include_history: bool) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Пачки записей экспорта, читаемые через серверный курсор"""
+    # Сессия запроса закрывается до отправки тела ответа, поэтому поток открывает свою
+    async with with_database() as db:
+        tasks = await db.stream(select(Task.id, ProjectSection.name.label("section"), Task.name,
+                                       Task.description, Task.priority, Task.deadline, Task.finished,
+                                       Task.finished_at, Task.completion_time, Task.tags,
+                                       Task.executor_id, Task.created_by, Task.created_at)
+                                .join(ProjectSection, ProjectSection.id == Task.section_id)
+                                .filter(ProjectSection.project_id == project_id)
+                                .order_by(Task.id)
+                                .execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in tasks.partitions():
+            yield [{"record": "task", "task_id": row.id, "section": row.section, "name": row.name,
+                    "description": row.description, "priority": row.priority, "deadline": row.deadline,
+                    "finished": row.finished, "finished_at": row.finished_at,
+                    "completion_time": row.completion_time, "tags": row.tags,
+                    "executor_id": row.executor_id, "created_by": row.created_by,
+                    "created_at": row.created_at} for row in rows]
+        if not include_history:
+            return
+        messages = await db.stream(select(TaskMessage.task_id, TaskMessage.message_type, TaskMessage.text,
+                                          TaskMessage.created_by, TaskMessage.created_at)
+                                   .join(Task, Task.id == TaskMessage.task_id)
+                                   .join(ProjectSection, ProjectSection.id == Task.section_id)
+                                   .filter(ProjectSection.project_id == project_id)
+                                   .order_by(TaskMessage.task_id, TaskMessage.id)
+                                   .execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in messages.partitions():
+            yield [{"record": "message", "task_id": row.task_id, "message_type": row.message_type,
+                    "text": row.text, "created_by": row.created_by,
+                    "created_at": row.created_at} for row in rows]
+
+
+def _export_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return ",".join(value)
+    return value
+
+
+async def _export_ndjson(records: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    async for batch in records:
+        yield "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":"),
+                                 default=_export_value) + "\n" for record in batch)
+
+
+async def _export_csv(records: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_CSV_FIELDS)
+    writer.writeheader()
+    async for batch in records:
+        writer.writerows({key: _export_value(value) for key, value in record.items()} for record in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+@router.get("/{project_id}/export",
+            response_class=StreamingResponse,
+            responses=errors.with_errors(errors.project_not_found(),
+                                         errors.access_denied()))
+async def export_project(project_id: int,
+                         format: Literal["ndjson", "csv"] = "ndjson",
+                         include_history: bool = True,
+                         user: User = Depends(get_user),
+                         db: Session = Depends(get_database)):
+    project = await db.scalar(select(Project).filter(Project.id == project_id).limit(1))
+    if project is None:
+        raise errors.project_not_found()
+    if await db.scalar(select(ProjectUsers).filter_by(project_id=project_id,
+                                                      user_id=user.id).limit(1)) is None:
+        raise errors.access_denied()
+
+    records = _export_records(project_id, include_history)
+    if format == "csv":
+        content, media_type = _export_csv(records), "text/csv"
+    else:
+        content, media_type = _export_ndjson(records), "application/x-ndjson"
+    return StreamingResponse(content, media_type=media_type,
+                             headers={"Content-Disposition":
+                                      f'attachment; filename="project-{project_id}.{format}"'})
+
+
+EVENTS_HEARTBEAT = 15
+
+
+async def _board_events(project_id: int, request: Request) -> AsyncIterator[str]:
+    async with hub.subscribe(project_id) as queue:
+        # the client reloads the board after this comment, so nothing between reload and subscription is lost
+        yield "retry: 3000\n: subscribed\n\n"
+        while not await request.is_disconnected():
+            try:
+                message = await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # keeps proxies from closing an idle connection
+                yield ": ping\n\n"
+                continue
+            yield f"event: {message['type']}\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+            if message["type"] == "project.deleted":
+                return
+
+
+@router.get("/{project_id}/events",
+            response_class=StreamingResponse,
+            responses=errors.with_errors(errors.project_not_found(),
+                                         errors.access_denied()))
+async def project_events(project_id: int,
+                         request: Request,
+                         user: User = Depends(get_user),
+                         db: Session = Depends(get_database)):
+    project = await db.scalar(select(Project).filter(Project.id == project_id).limit(1))
+    if project is None:
+        raise errors.project_not_found()
+    if await db.scalar(select(ProjectUsers).filter_by(project_id=project_id,
+                                                      user_id=user.id).limit(1)) is None:
+        raise errors.access_denied()
+    return StreamingResponse(_board_events(project_id, request), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,20 +1,29 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import select, delete
 
 import errors
 from auth import get_user
-from db import Session, get_database
+from etag import make_etag, etag_matches, not_modified, rows_version
+from responses import model_response
+from db import Session, get_database, get_read_database
 from schemas.section import (
     SectionInfoSchema,
     SectionCreateSchema,
+    SectionMoveSchema,
     SectionUpdateSchema
 )
 from models.project import ProjectSection
-from models.task import Task
+from models.task import Task, TaskMessage, TaskTimeInterval
+from events import publish
+from ranks import MAX_RANK_LENGTH, append_ranks, neighbour_rank, rank_between, rebalance
 
 router = APIRouter()
 
+section_list_adapter = TypeAdapter(List[SectionInfoSchema])
+
 
 @router.post("/{project_id}/sections")
 async def create_section(
@@ -25,15 +34,19 @@ async def create_section(
 ) -> SectionInfoSchema:
     if access is None:
         raise errors.unauthorized()
+    rank = (await append_ranks(db, ProjectSection.rank, ProjectSection.project_id, {project_id: 1}))[project_id][0]
     section = ProjectSection(
         project_id=project_id,
         position=section_info.position,
+        rank=rank,
         name=section_info.name,
         color=section_info.color
     )
 
     db.add(section)
-    db.commit()
+    await db.flush()
+    await publish(db, project_id, "section.created", [section.id])
+    await db.commit()
 
     return SectionInfoSchema(
         id=section.id,
@@ -46,39 +59,51 @@ async def create_section(
 @router.get("/{project_id}/section")
 async def get_project_sections(
         project_id: int,
-        db: Session = Depends(get_database),
+        request: Request,
+        db: Session = Depends(get_read_database),
         access=Depends(get_user)
 ) -> List[SectionInfoSchema]:
     if access is None:
         raise errors.unauthorized()
-    sections = db.query(ProjectSection).filter_by(project_id=project_id).all()
-    return [
-        SectionInfoSchema(
-            id=section.id,
-            name=section.name,
-            position=section.position,
-            color=section.color
-        ) for section in sections
-    ]
+    sections_version = await db.scalar(select(
+        rows_version(ProjectSection.id, ProjectSection.updated_at)
+    ).filter_by(project_id=project_id))
+    etag = make_etag(project_id, sections_version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    sections = (await db.execute(select(
+        ProjectSection.id,
+        ProjectSection.name,
+        ProjectSection.position,
+        ProjectSection.color
+    ).filter_by(project_id=project_id).order_by(ProjectSection.rank, ProjectSection.id))).mappings().all()
+    return model_response(section_list_adapter, sections, headers={"ETag": etag})
 
 
 @router.get("/{project_id}/section/{section_id}")
 async def get_section(
         project_id: int,
         section_id: int,
-        db: Session = Depends(get_database),
+        request: Request,
+        response: Response,
+        db: Session = Depends(get_read_database),
         access=Depends(get_user)
 ) -> SectionInfoSchema:
     if access is None:
         raise errors.unauthorized()
-    section = db.query(ProjectSection).filter_by(
+    section = await db.scalar(select(ProjectSection).filter_by(
         project_id=project_id,
         id=section_id
-    ).first()
+    ).limit(1))
 
     if section is None:
         raise errors.section_is_not_found()
 
+    etag = make_etag(section.id, section.updated_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
     return SectionInfoSchema(
         id=section.id,
         name=section.name,
@@ -97,23 +122,24 @@ async def delete_section(
     if access is None:
         raise errors.unauthorized()
 
-    section = db.query(ProjectSection).filter_by(
+    section = await db.scalar(select(ProjectSection).filter_by(
         id=section_id,
         project_id=project_id
-    ).first()
+    ).limit(1))
 
     if section is None:
         raise errors.section_is_not_found()
 
-    section_tasks = db.query(Task).filter_by(
-        section_id=section_id
-    ).all()
-
-    for section_task in section_tasks:
-        db.delete(section_task)
-    db.flush()
-    db.delete(section)
-    db.commit()
+    section_tasks = select(Task.id).filter_by(section_id=section_id)
+    for statement in (
+        delete(TaskMessage).filter(TaskMessage.task_id.in_(section_tasks)),
+        delete(TaskTimeInterval).filter(TaskTimeInterval.task_id.in_(section_tasks)),
+        delete(Task).filter_by(section_id=section_id),
+        delete(ProjectSection).filter_by(id=section_id)
+    ):
+        await db.execute(statement.execution_options(synchronize_session=False))
+    await publish(db, project_id, "section.deleted", [section_id])
+    await db.commit()
 
 
 @router.patch("/{project_id}/section/{section_id}")
@@ -127,10 +153,10 @@ async def update_section(
     if access is None:
         raise errors.unauthorized()
 
-    section = db.query(ProjectSection).filter_by(
+    section = await db.scalar(select(ProjectSection).filter_by(
         project_id=project_id,
         id=section_id
-    ).first()
+    ).limit(1))
 
     if section is None:
         raise errors.section_is_not_found()
@@ -142,7 +168,8 @@ async def update_section(
     if section_info.position is not None:
         section.position = section_info.position
 
-    db.commit()
+    await publish(db, project_id, "section.updated", [section.id])
+    await db.commit()
 
     return SectionInfoSchema(
         id=section.id,
@@ -150,3 +177,49 @@ async def update_section(
         position=section.position,
         color=section.color
     )
+
+
+@router.post("/{project_id}/section/{section_id}/move", status_code=status.HTTP_204_NO_CONTENT)
+async def move_section(
+        project_id: int,
+        section_id: int,
+        move: SectionMoveSchema,
+        background_tasks: BackgroundTasks,
+        db: Session = Depends(get_database),
+        access=Depends(get_user)
+) -> None:
+    if access is None:
+        raise errors.unauthorized()
+    if move.before_id is not None and move.after_id is not None:
+        raise errors.invalid_move()
+
+    section = await db.scalar(select(ProjectSection).filter_by(
+        project_id=project_id,
+        id=section_id
+    ).limit(1))
+
+    if section is None:
+        raise errors.section_is_not_found()
+
+    anchor_id = move.before_id if move.before_id is not None else move.after_id
+    if anchor_id is not None:
+        if anchor_id == section.id:
+            raise errors.invalid_move()
+        anchor_rank = await db.scalar(select(ProjectSection.rank).filter_by(
+            project_id=project_id,
+            id=anchor_id
+        ))
+        if anchor_rank is None:
+            raise errors.section_is_not_found()
+        below = move.before_id is not None
+        neighbour = await neighbour_rank(db, ProjectSection.rank, ProjectSection.project_id == project_id,
+                                         anchor_rank, below, ProjectSection.id != section.id)
+        rank = rank_between(neighbour, anchor_rank) if below else rank_between(anchor_rank, neighbour)
+    else:
+        rank = (await append_ranks(db, ProjectSection.rank, ProjectSection.project_id, {project_id: 1}))[project_id][0]
+
+    section.rank = rank
+    await publish(db, project_id, "section.updated", [section.id])
+    await db.commit()
+    if len(rank) > MAX_RANK_LENGTH:
+        background_tasks.add_task(rebalance, ProjectSection, project_id=project_id)
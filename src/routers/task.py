@@ -1,17 +1,32 @@
-from fastapi import APIRouter, Depends
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response
+from sqlalchemy import select, insert, update, delete, values, column, exists, func, literal, or_, text, tuple_
+from sqlalchemy.dialects.postgresql import REAL, REGCONFIG, insert as pg_insert
+from typing import Any, Dict, List, Literal, Optional
+from collections import Counter
+from datetime import datetime
 
 from models.user import User, UserInfo
 from models.project import ProjectUsers, ProjectSection
-from db import get_database, Session
+from db import get_database, get_read_database, Session
 from auth import get_user
+from etag import make_etag, etag_matches, not_modified
+from responses import model_response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import aliased
 
 import errors
 from models.project import Project, ProjectSection, ProjectUsers
-from models.task import Task, TaskMessage
-from schemas.task import CreateTaskRequest, GetTaskResponse, \
-                        GetTaskInfo, UpdateTaskRequest, TaskMessage as TM, CreateTask, UserInfoSchema
-from schemas.enums import EnumMessageType
+from models.task import Task, TaskMessage, TaskTimeInterval, task_deadline_key, SEARCH_CONFIG
+from schemas.task import CreateTaskRequest, GetTaskResponse, GetTaskInfo, GetTaskPage, \
+                        UpdateTaskRequest, CreateTask, UserInfoSchema, \
+                        BatchCreateTaskRequest, BatchCreateTaskResponse, BatchUpdateTaskRequest, TaskTagCount, \
+                        ImportTasksResponse, TimeSpent, MoveTaskRequest, TaskMessagePage
+from schemas.enums import EnumMessageType, EnumTaskPriority
+from pagination import encode_cursor, decode_cursor
+from importer import import_tasks
+from events import publish
+from sqlstats import query_budget
+from ranks import MAX_RANK_LENGTH, append_ranks, neighbour_rank, rank_between, rebalance
 
 router = APIRouter()
 
@@ -24,18 +39,19 @@ async def create_task(request: CreateTaskRequest,
                       user: User = Depends(get_user),
                       db: Session = Depends(get_database)):
     # check if user is on project
-    user_in_project = db.query(ProjectUsers).filter(ProjectUsers.project_id == request.project_id,
-                                                    ProjectUsers.user_id == user.id).first()
+    user_in_project = await db.scalar(select(ProjectUsers).filter(ProjectUsers.project_id == request.project_id,
+                                                                  ProjectUsers.user_id == user.id).limit(1))
     if user_in_project is None:
         raise errors.access_denied()
     # check if section matches section
-    section = db.query(ProjectSection).filter(ProjectSection.project_id == request.project_id,
-                                              ProjectSection.id == request.section_id).first()
+    section = await db.scalar(select(ProjectSection).filter(ProjectSection.project_id == request.project_id,
+                                                            ProjectSection.id == request.section_id).limit(1))
     if section is None:
         raise errors.section_is_not_found()
 
     task = Task()
     task.section_id = request.section_id
+    task.rank = (await append_ranks(db, Task.rank, Task.section_id, {request.section_id: 1}))[request.section_id][0]
     task.name = request.name
     task.created_by = user.id
     task.executor_id = request.executor_id
@@ -54,87 +70,517 @@ async def create_task(request: CreateTaskRequest,
     if request.tags:
         task.tags = request.tags
     db.add(task)
-    db.flush()
-    db.commit()
+    await db.flush()
+    await publish(db, request.project_id, "task.created", [task.id])
+    await db.commit()
     return CreateTask(task_id=task.id)
 
 
+async def _task_project_id(db: Session, task: Task) -> int:
+    return await db.scalar(select(ProjectSection.project_id).filter_by(id=task.section_id))
+
+
+def _full_name(user_info: UserInfo) -> str:
+    name = user_info.name
+    if user_info.surname is not None:
+        name += f" {user_info.surname}"
+    return name
+
+
+@router.post("/batch",
+             status_code=201,
+             response_model=BatchCreateTaskResponse,
+             responses=errors.with_errors(errors.access_denied(),
+                                          errors.section_is_not_found()))
+async def create_tasks(request: BatchCreateTaskRequest,
+                       user: User = Depends(get_user),
+                       db: Session = Depends(get_database)):
+    project_ids = {task.project_id for task in request.tasks}
+    # check if user is on every project at once
+    user_projects = set((await db.scalars(select(ProjectUsers.project_id)
+                                          .filter(ProjectUsers.user_id == user.id,
+                                                  ProjectUsers.project_id.in_(project_ids)))).all())
+    if user_projects != project_ids:
+        raise errors.access_denied()
+    # check if every section belongs to its task's project
+    sections = dict((await db.execute(select(ProjectSection.id, ProjectSection.project_id)
+                                      .filter(ProjectSection.id.in_({task.section_id
+                                                                     for task in request.tasks})))).all())
+    if any(sections.get(task.section_id) != task.project_id for task in request.tasks):
+        raise errors.section_is_not_found()
+
+    ranks = await append_ranks(db, Task.rank, Task.section_id, Counter(task.section_id for task in request.tasks))
+    ranks = {section_id: iter(section_ranks) for section_id, section_ranks in ranks.items()}
+    rows = [dict(section_id=task.section_id,
+                 rank=next(ranks[task.section_id]),
+                 name=task.name,
+                 created_by=user.id,
+                 executor_id=task.executor_id,
+                 description=task.description or None,
+                 priority=task.priority or EnumTaskPriority.medium,
+                 deadline=task.deadline or None,
+                 finished=bool(task.finished),
+                 finished_at=task.finished_at or None,
+                 completion_time=task.completion_time or 0,
+                 tags=task.tags or None) for task in request.tasks]
+    task_ids = (await db.scalars(insert(Task).returning(Task.id, sort_by_parameter_order=True), rows)).all()
+    for project_id in project_ids:
+        await publish(db, project_id, "task.created",
+                      [task_id for task_id, task in zip(task_ids, request.tasks) if task.project_id == project_id])
+    await db.commit()
+    return BatchCreateTaskResponse(task_ids=task_ids)
+
+
+@router.patch("/batch",
+              status_code=204,
+              responses=errors.with_errors(errors.access_denied(),
+                                           errors.section_is_not_found(),
+                                           errors.task_not_found(),
+                                           errors.duplicate_task_ids()))
+async def update_tasks(request: BatchUpdateTaskRequest,
+                       user: User = Depends(get_user),
+                       db: Session = Depends(get_database)):
+    task_ids = {task.id for task in request.tasks}
+    if len(task_ids) != len(request.tasks):
+        # the VALUES join would update the same row once per duplicate
+        raise errors.duplicate_task_ids()
+    task_projects = dict((await db.execute(select(Task.id, ProjectSection.project_id)
+                                           .join(ProjectSection, ProjectSection.id == Task.section_id)
+                                           .filter(Task.id.in_(task_ids)))).all())
+    if len(task_projects) != len(task_ids):
+        raise errors.task_not_found()
+    project_ids = set(task_projects.values())
+    user_projects = set((await db.scalars(select(ProjectUsers.project_id)
+                                          .filter(ProjectUsers.user_id == user.id,
+                                                  ProjectUsers.project_id.in_(project_ids)))).all())
+    if user_projects != project_ids:
+        raise errors.access_denied()
+
+    moves = {task.id: task.section_id for task in request.tasks if task.section_id}
+    sections = {}
+    if moves:
+        sections = {section.id: section for section in
+                    (await db.execute(select(ProjectSection.id, ProjectSection.project_id, ProjectSection.name)
+                                      .filter(ProjectSection.id.in_(set(moves.values()))))).all()}
+        for task_id, section_id in moves.items():
+            section = sections.get(section_id)
+            if section is None or section.project_id != task_projects[task_id]:
+                raise errors.section_is_not_found()
+    executors = {}
+    executor_ids = {task.executor_id for task in request.tasks if task.executor_id}
+    if executor_ids:
+        executors = {info.user_id: info for info in
+                     (await db.scalars(select(UserInfo).filter(UserInfo.user_id.in_(executor_ids)))).all()}
+
+    # None and falsy fields keep the current value, as in update_task
+    fields = ["section_id", "executor_id", "priority", "deadline",
+              "finished", "finished_at", "completion_time", "tags"]
+    fields = [field for field in fields if any(getattr(task, field) for task in request.tasks)]
+    changed = [{field: getattr(task, field) or None for field in fields} for task in request.tasks]
+    if moves:
+        # moved tasks go to the end of their new section
+        section_ranks = await append_ranks(db, Task.rank, Task.section_id, Counter(moves.values()))
+        section_ranks = {section_id: iter(ranks) for section_id, ranks in section_ranks.items()}
+        task_ranks = {task_id: next(section_ranks[section_id]) for task_id, section_id in moves.items()}
+        fields.append("rank")
+        for task, item in zip(request.tasks, changed):
+            item["rank"] = task_ranks.get(task.id)
+    if fields:
+        changes = values(column("id", Task.id.type),
+                         *[column(field, getattr(Task, field).type) for field in fields],
+                         name="changes").data([(task.id, *[item[field] for field in fields])
+                                               for task, item in zip(request.tasks, changed)])
+        await db.execute(update(Task)
+                         .where(Task.id == changes.c.id)
+                         .values({field: func.coalesce(changes.c[field], getattr(Task, field))
+                                  for field in fields})
+                         .execution_options(synchronize_session=False))
+
+    who = _full_name(user.user_info)
+    msgs = []
+    for task in request.tasks:
+        if task.section_id:
+            msgs.append(dict(task_id=task.id,
+                             message_type=str(EnumMessageType.declarative),
+                             text=f"{who} перенёс задачу в {sections[task.section_id].name}",
+                             created_by=user.id))
+        if task.executor_id and task.executor_id in executors:
+            msgs.append(dict(task_id=task.id,
+                             message_type=str(EnumMessageType.declarative),
+                             text=f"{who} назначил(а) {_full_name(executors[task.executor_id])} исполнителем",
+                             created_by=user.id))
+    if msgs:
+        await db.execute(insert(TaskMessage), msgs)
+    for project_id in project_ids:
+        await publish(db, project_id, "task.updated",
+                      [task_id for task_id, task_project_id in task_projects.items() if task_project_id == project_id])
+    await db.commit()
+
+
+@router.post("/import",
+             response_model=ImportTasksResponse,
+             responses=errors.with_errors(errors.access_denied(),
+                                          errors.invalid_import_file()))
+async def import_project_tasks(project_id: int,
+                               request: Request,
+                               format: Literal["ndjson", "csv"] = "ndjson",
+                               user: User = Depends(get_user),
+                               db: Session = Depends(get_database)):
+    user_in_project = await db.scalar(select(ProjectUsers).filter(ProjectUsers.project_id == project_id,
+                                                                  ProjectUsers.user_id == user.id).limit(1))
+    if user_in_project is None:
+        raise errors.access_denied()
+    try:
+        content = (await request.body()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise errors.invalid_import_file()
+    result = await import_tasks(db, project_id, user.id, content, format)
+    if result.imported:
+        await publish(db, project_id, "task.created")
+    await db.commit()
+    return result
+
+
+TASK_MESSAGES_LIMIT = 20
+
+task_message_page_adapter = TypeAdapter(TaskMessagePage)
+
+
+def _messages_query(task_id: int):
+    """История задачи от новых сообщений к старым, по индексу ix_task_message_history"""
+    return (select(TaskMessage.id, TaskMessage.text, TaskMessage.created_at)
+            .filter(TaskMessage.task_id == task_id)
+            .order_by(TaskMessage.created_at.desc(), TaskMessage.id.desc()))
+
+
+async def _messages_page(db: Session, query, limit: int) -> Dict[str, Any]:
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return {"items": [{"text": row.text, "created_at": row.created_at} for row in rows[:limit]],
+            "next_cursor": next_cursor}
+
+
 @router.get("/{task_id}",
             response_model=GetTaskResponse,
-            responses=errors.with_errors())
+            responses=errors.with_errors(errors.task_not_found()))
+@query_budget(3)
 async def get_task(task_id: int,
+                   request: Request,
+                   response: Response,
+                   messages: int = Query(TASK_MESSAGES_LIMIT, ge=0, le=100),
                    user: User = Depends(get_user),
-                   db: Session = Depends(get_database)):
-    task = db.query(Task).filter_by(id=task_id).first()
-    executor = None
-    creator = None
-    crtr = db.query(UserInfo).filter_by(user_id=task.created_by).first()
-    exc = db.query(UserInfo).filter_by(user_id=task.executor_id).first()
-    if crtr is not None:
-        creator = UserInfoSchema(
-            id=crtr.user_id,
-            name=crtr.name,
-            surname=crtr.surname
-        )
-    if exc is not None:
-        executor = UserInfoSchema(
-            id=exc.user_id,
-            name=exc.name,
-            surname=exc.surname
-        )
-    messages = []
-    for msg in db.query(TaskMessage).filter_by(task_id=task_id).all():
-        messages.append(TM(
-            text=msg.text,
-            created_at=msg.created_at
-        ))
+                   db: Session = Depends(get_read_database)):
+    """Карточка задачи с последними сообщениями истории.
+
+    Более старые сообщения отдаёт GET /{task_id}/messages начиная
+    с messages_cursor.
+    """
+    creator = aliased(UserInfo)
+    executor = aliased(UserInfo)
+    last_message_id = _messages_query(task_id).with_only_columns(TaskMessage.id).limit(1).scalar_subquery()
+    row = (await db.execute(select(Task, creator, executor, last_message_id.label("last_message_id"))
+                            .outerjoin(creator, creator.user_id == Task.created_by)
+                            .outerjoin(executor, executor.user_id == Task.executor_id)
+                            .filter(Task.id == task_id)
+                            # the requesting user's user_info is already in the session from the auth cache
+                            .execution_options(populate_existing=True))).first()
+    if row is None:
+        raise errors.task_not_found()
+    task = row.Task
+    # new history messages (timer start, for instance) do not touch task.updated_at;
+    # the card embeds the creator's and executor's names, which have no version of their own
+    etag = make_etag(task.id, task.updated_at, row.last_message_id, messages,
+                     *((info.user_id, info.name, info.surname) if info is not None else None
+                       for info in (row[1], row[2])))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    history = {"items": [], "next_cursor": None}
+    if messages and row.last_message_id is not None:
+        history = await _messages_page(db, _messages_query(task_id), messages)
     return GetTaskResponse(
         id=task.id,
         section_id=task.section_id,
         created_at=task.created_at,
-        created_by=creator,
+        created_by=(UserInfoSchema(id=row[1].user_id, name=row[1].name, surname=row[1].surname)
+                    if row[1] is not None else None),
         name=task.name,
         description=task.description,
-        executor=executor,
+        executor=(UserInfoSchema(id=row[2].user_id, name=row[2].name, surname=row[2].surname)
+                  if row[2] is not None else None),
         priority=task.priority,
         deadline=task.deadline,
         finished=task.finished,
         finished_at=task.finished_at,
         completion_time=task.completion_time,
-        messages=messages,
-        tags=task.tags
+        tags=task.tags,
+        messages=history["items"],
+        messages_cursor=history["next_cursor"]
     )
 
 
+@router.get("/{task_id}/messages",
+            response_model=TaskMessagePage,
+            responses=errors.with_errors(errors.task_not_found(),
+                                         errors.access_denied(),
+                                         errors.invalid_cursor()))
+@query_budget(3)
+async def get_task_messages(task_id: int,
+                            cursor: Optional[str] = None,
+                            limit: int = Query(50, ge=1, le=200),
+                            user: User = Depends(get_user),
+                            db: Session = Depends(get_read_database)):
+    # the task and the user's membership in its project in one statement
+    membership = (await db.execute(select(ProjectUsers.user_id)
+                                   .select_from(Task)
+                                   .join(ProjectSection, ProjectSection.id == Task.section_id)
+                                   .outerjoin(ProjectUsers, (ProjectUsers.project_id == ProjectSection.project_id)
+                                              & (ProjectUsers.user_id == user.id))
+                                   .filter(Task.id == task_id))).first()
+    if membership is None:
+        raise errors.task_not_found()
+    if membership.user_id is None:
+        raise errors.access_denied()
+    query = _messages_query(task_id)
+    if cursor is not None:
+        created_at, message_id = decode_cursor(cursor, 2)
+        try:
+            created_at = literal(datetime.fromisoformat(created_at), TaskMessage.created_at.type)
+            message_id = literal(int(message_id), TaskMessage.id.type)
+        except (ValueError, TypeError):
+            raise errors.invalid_cursor()
+        query = query.filter(tuple_(TaskMessage.created_at, TaskMessage.id) < tuple_(created_at, message_id))
+    return model_response(task_message_page_adapter, await _messages_page(db, query, limit))
+
+
+def _task_info_query(*columns):
+    """Выборка столбцов GetTaskInfo вместе с исполнителем одним запросом"""
+    return (select(Task.id, Task.section_id, Task.name, Task.description, Task.priority,
+                   Task.deadline, Task.finished, Task.completion_time, Task.tags,
+                   UserInfo.user_id.label("executor_id"),
+                   UserInfo.name.label("executor_name"),
+                   UserInfo.surname.label("executor_surname"),
+                   *columns)
+            .outerjoin(UserInfo, UserInfo.user_id == Task.executor_id))
+
+
+task_page_adapter = TypeAdapter(GetTaskPage)
+task_list_adapter = TypeAdapter(List[GetTaskInfo])
+
+
+def _task_info(task) -> Dict[str, Any]:
+    """Данные GetTaskInfo; валидируются один раз вместе со страницей"""
+    executor = None
+    if task.executor_id is not None:
+        executor = {
+            "id": task.executor_id,
+            "name": task.executor_name,
+            "surname": task.executor_surname
+        }
+    return {
+        "id": task.id,
+        "section_id": task.section_id,
+        "name": task.name,
+        "description": task.description,
+        "executor": executor,
+        "deadline": task.deadline,
+        "finished": task.finished,
+        "completion_time": task.completion_time,
+        "tags": task.tags
+    }
+
+
+def _project_tasks_query(project_id: int,
+                         section_id: Optional[int],
+                         executor_id: Optional[int],
+                         finished: Optional[bool],
+                         tags: Optional[List[str]],
+                         tags_mode: str,
+                         deadline_from: Optional[datetime],
+                         deadline_to: Optional[datetime]):
+    """Задачи проекта с фильтрами списка"""
+    sections_q = select(ProjectSection.id).filter_by(project_id=project_id)
+    query = _task_info_query(Task.rank).filter(Task.section_id.in_(sections_q))
+    if section_id is not None:
+        query = query.filter(Task.section_id == section_id)
+    if executor_id is not None:
+        query = query.filter(Task.executor_id == executor_id)
+    if finished is not None:
+        query = query.filter(Task.finished == finished)
+    if tags:
+        query = query.filter(Task.tags.contains(tags) if tags_mode == "all" else Task.tags.overlap(tags))
+    if deadline_from is not None:
+        query = query.filter(Task.deadline >= deadline_from)
+    if deadline_to is not None:
+        query = query.filter(Task.deadline < deadline_to)
+    return query
+
+
 @router.get("/all/",
             response_model=List[GetTaskInfo],
-            responses=errors.with_errors())
+            responses=errors.with_errors(),
+            deprecated=True)
+@query_budget(2)
 async def get_project_tasks(project_id: int,
+                            section_id: Optional[int] = None,
+                            executor_id: Optional[int] = None,
+                            finished: Optional[bool] = None,
+                            tags: Optional[List[str]] = Query(None),
+                            tags_mode: Literal["all", "any"] = "all",
+                            deadline_from: Optional[datetime] = None,
+                            deadline_to: Optional[datetime] = None,
                             user: User = Depends(get_user),
-                            db: Session = Depends(get_database)):
-    tasks = []
-    sections_q = db.query(ProjectSection.id).filter_by(project_id=project_id)
-    for task in db.query(Task).filter(Task.section_id.in_(sections_q)).all():
-        executor = None
-        exc = db.query(UserInfo).filter_by(user_id=task.executor_id).first()
-        if exc is not None:
-            executor = UserInfoSchema(
-                id=exc.user_id,
-                name=exc.name,
-                surname=exc.surname
-            )
-        tasks.append(GetTaskInfo(
-            id=task.id,
-            section_id=task.section_id,
-            name=task.name,
-            description=task.description,
-            executor=executor,
-            deadline=task.deadline,
-            finished=task.finished,
-            completion_time=task.completion_time,
-            tags=task.tags
-        ))
-    return tasks
+                            db: Session = Depends(get_read_database)):
+    """Все задачи проекта одним списком, по секциям и приоритету.
+
+    Оставлен для существующих клиентов: размер ответа не ограничен.
+    Постраничный список с курсором отдаёт GET /page/.
+    """
+    query = _project_tasks_query(project_id, section_id, executor_id, finished, tags, tags_mode,
+                                 deadline_from, deadline_to)
+    rows = await db.execute(query.order_by(Task.section_id, Task.priority, task_deadline_key, Task.id))
+    return model_response(task_list_adapter, [_task_info(task) for task in rows])
+
+
+@router.get("/page/",
+            response_model=GetTaskPage,
+            responses=errors.with_errors(errors.invalid_cursor()))
+@query_budget(2)
+async def get_project_task_page(project_id: int,
+                                cursor: Optional[str] = None,
+                                limit: int = Query(100, ge=1, le=500),
+                                section_id: Optional[int] = None,
+                                executor_id: Optional[int] = None,
+                                finished: Optional[bool] = None,
+                                tags: Optional[List[str]] = Query(None),
+                                tags_mode: Literal["all", "any"] = "all",
+                                deadline_from: Optional[datetime] = None,
+                                deadline_to: Optional[datetime] = None,
+                                order: Literal["priority", "rank"] = "priority",
+                                user: User = Depends(get_user),
+                                db: Session = Depends(get_read_database)):
+    """Страница задач проекта с курсором следующей страницы.
+
+    Секции идут одна за другой, внутри секции задачи упорядочены по приоритету
+    и дедлайну (order=priority) или по доске (order=rank). Ключ порядка
+    начинается с section_id, поэтому глубокие страницы читаются индексом
+    так же, как первая.
+    """
+    query = _project_tasks_query(project_id, section_id, executor_id, finished, tags, tags_mode,
+                                 deadline_from, deadline_to)
+    if order == "rank":
+        # board order, served by ix_task_section_rank
+        if cursor is not None:
+            cursor_section_id, rank, task_id = decode_cursor(cursor, 3)
+            try:
+                cursor_key = tuple_(literal(int(cursor_section_id), Task.section_id.type),
+                                    literal(str(rank), Task.rank.type),
+                                    literal(int(task_id), Task.id.type))
+            except (ValueError, TypeError):
+                raise errors.invalid_cursor()
+            query = query.filter(tuple_(Task.section_id, Task.rank, Task.id) > cursor_key)
+        query = query.order_by(Task.section_id, Task.rank, Task.id).limit(limit + 1)
+    else:
+        # served by ix_task_section_order
+        if cursor is not None:
+            cursor_section_id, priority, deadline, task_id = decode_cursor(cursor, 4)
+            try:
+                cursor_key = tuple_(literal(int(cursor_section_id), Task.section_id.type),
+                                    literal(EnumTaskPriority(priority), Task.priority.type),
+                                    (literal(datetime.fromisoformat(deadline), Task.deadline.type)
+                                     if deadline is not None else text("'infinity'::timestamptz")),
+                                    literal(int(task_id), Task.id.type))
+            except (ValueError, TypeError):
+                raise errors.invalid_cursor()
+            query = query.filter(tuple_(Task.section_id, Task.priority, task_deadline_key, Task.id) > cursor_key)
+        query = query.order_by(Task.section_id, Task.priority, task_deadline_key, Task.id).limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    tasks = [_task_info(task) for task in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = (encode_cursor(last.section_id, last.rank, last.id) if order == "rank"
+                       else encode_cursor(last.section_id, last.priority, last.deadline, last.id))
+    return model_response(task_page_adapter, {"items": tasks, "next_cursor": next_cursor})
+
+
+@router.get("/tags/",
+            response_model=List[TaskTagCount],
+            responses=errors.with_errors(errors.access_denied()))
+async def get_project_tags(project_id: int,
+                           section_id: Optional[int] = None,
+                           finished: Optional[bool] = None,
+                           user: User = Depends(get_user),
+                           db: Session = Depends(get_read_database)):
+    user_in_project = await db.scalar(select(ProjectUsers).filter(ProjectUsers.project_id == project_id,
+                                                                  ProjectUsers.user_id == user.id).limit(1))
+    if user_in_project is None:
+        raise errors.access_denied()
+    sections_q = select(ProjectSection.id).filter_by(project_id=project_id)
+    tags_q = (select(func.unnest(Task.tags).label("tag"))
+              .filter(Task.section_id.in_(sections_q), Task.tags.is_not(None)))
+    if section_id is not None:
+        tags_q = tags_q.filter(Task.section_id == section_id)
+    if finished is not None:
+        tags_q = tags_q.filter(Task.finished == finished)
+    tags_q = tags_q.subquery()
+    count = func.count().label("count")
+    rows = await db.execute(select(tags_q.c.tag, count)
+                            .group_by(tags_q.c.tag)
+                            .order_by(count.desc(), tags_q.c.tag))
+    return [TaskTagCount(tag=row.tag, count=row.count) for row in rows]
+
+
+@router.get("/search/",
+            response_model=GetTaskPage,
+            responses=errors.with_errors(errors.access_denied(),
+                                         errors.invalid_cursor()))
+async def search_tasks(q: str = Query(min_length=1, max_length=256),
+                       project_id: Optional[int] = None,
+                       include_messages: bool = False,
+                       cursor: Optional[str] = None,
+                       limit: int = Query(50, ge=1, le=200),
+                       user: User = Depends(get_user),
+                       db: Session = Depends(get_read_database)):
+    user_projects = select(ProjectUsers.project_id).filter(ProjectUsers.user_id == user.id)
+    if project_id is not None:
+        user_in_project = await db.scalar(select(ProjectUsers).filter(ProjectUsers.project_id == project_id,
+                                                                      ProjectUsers.user_id == user.id).limit(1))
+        if user_in_project is None:
+            raise errors.access_denied()
+        sections_q = select(ProjectSection.id).filter(ProjectSection.project_id == project_id)
+    else:
+        sections_q = select(ProjectSection.id).filter(ProjectSection.project_id.in_(user_projects))
+
+    ts_query = func.websearch_to_tsquery(literal(SEARCH_CONFIG).cast(REGCONFIG), q)
+    rank = func.ts_rank(Task.search_vector, ts_query)
+    match = Task.search_vector.bool_op("@@")(ts_query)
+    if include_messages:
+        match = or_(match, exists().where(TaskMessage.task_id == Task.id,
+                                          TaskMessage.search_vector.bool_op("@@")(ts_query)))
+    query = _task_info_query(rank.label("rank")).filter(Task.section_id.in_(sections_q), match)
+    if cursor is not None:
+        last_rank, task_id = decode_cursor(cursor, 2)
+        try:
+            last_rank = literal(float(last_rank), REAL)
+            task_id = literal(int(task_id), Task.id.type)
+        except (ValueError, TypeError):
+            raise errors.invalid_cursor()
+        query = query.filter(tuple_(rank, Task.id) < tuple_(last_rank, task_id))
+    query = query.order_by(rank.desc(), Task.id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.rank, last.id)
+    return model_response(task_page_adapter, {"items": [_task_info(task) for task in rows[:limit]],
+                                              "next_cursor": next_cursor})
 
 
 @router.patch("/{task_id}",
@@ -144,8 +590,8 @@ async def update_task(task_id: int,
                       request: UpdateTaskRequest,
                       user: User = Depends(get_user),
                       db: Session = Depends(get_database)):
-    task = db.query(Task).filter_by(id=task_id).first()
-    user_info = db.query(UserInfo).filter_by(user_id=user.id).first()
+    task = await db.scalar(select(Task).filter_by(id=task_id).limit(1))
+    user_info = await db.scalar(select(UserInfo).filter_by(user_id=user.id).limit(1))
     who = user_info.name
     if user_info.surname is not None:
         who += f" {user_info.surname}"
@@ -153,7 +599,8 @@ async def update_task(task_id: int,
     
     if request.section_id:
         task.section_id = request.section_id
-        section_name = db.query(ProjectSection.name).filter_by(id=task.section_id)
+        task.rank = (await append_ranks(db, Task.rank, Task.section_id, {task.section_id: 1}))[task.section_id][0]
+        section_name = await db.scalar(select(ProjectSection.name).filter_by(id=task.section_id))
         msgs.append(TaskMessage(
             task_id=task.id,
             message_type=str(EnumMessageType.declarative),
@@ -162,7 +609,7 @@ async def update_task(task_id: int,
         ))
     if request.executor_id:
         task.executor_id = request.executor_id
-        executor_info = db.query(UserInfo).filter_by(user_id=task.executor_id).first()
+        executor_info = await db.scalar(select(UserInfo).filter_by(user_id=task.executor_id).limit(1))
         executor = user_info.name
         if user_info.surname is not None:
             executor += f" {executor_info.surname}"
@@ -188,55 +635,200 @@ async def update_task(task_id: int,
     msg.created_by = user.id
     msg.message_type = str(EnumMessageType.declarative)
     db.add_all(msgs)
-    db.commit()
+    await publish(db, await _task_project_id(db, task), "task.updated", [task.id])
+    await db.commit()
+
+
+@router.post("/{task_id}/move",
+             status_code=204,
+             responses=errors.with_errors(errors.task_not_found(),
+                                          errors.section_is_not_found(),
+                                          errors.access_denied(),
+                                          errors.invalid_move()))
+async def move_task(task_id: int,
+                    request: MoveTaskRequest,
+                    background_tasks: BackgroundTasks,
+                    user: User = Depends(get_user),
+                    db: Session = Depends(get_database)):
+    """Перемещение задачи перед или после другой задачи либо в конец секции.
+
+    Изменяется только строка самой задачи: новый ранг берётся между
+    рангами соседей.
+    """
+    if request.before_id is not None and request.after_id is not None:
+        raise errors.invalid_move()
+    task = await db.scalar(select(Task).filter_by(id=task_id).limit(1))
+    if task is None:
+        raise errors.task_not_found()
+    project_id = await _task_project_id(db, task)
+    user_in_project = await db.scalar(select(ProjectUsers).filter(ProjectUsers.project_id == project_id,
+                                                                  ProjectUsers.user_id == user.id).limit(1))
+    if user_in_project is None:
+        raise errors.access_denied()
+
+    anchor_id = request.before_id if request.before_id is not None else request.after_id
+    if anchor_id is not None:
+        if anchor_id == task.id:
+            raise errors.invalid_move()
+        anchor = (await db.execute(select(Task.section_id, Task.rank, ProjectSection.project_id)
+                                   .join(ProjectSection, ProjectSection.id == Task.section_id)
+                                   .filter(Task.id == anchor_id))).first()
+        if anchor is None:
+            raise errors.task_not_found()
+        if anchor.project_id != project_id:
+            raise errors.invalid_move()
+        section_id = anchor.section_id
+        below = request.before_id is not None
+        neighbour = await neighbour_rank(db, Task.rank, Task.section_id == section_id, anchor.rank, below,
+                                         Task.id != task.id)
+        rank = rank_between(neighbour, anchor.rank) if below else rank_between(anchor.rank, neighbour)
+    else:
+        section_id = request.section_id or task.section_id
+        if await db.scalar(select(ProjectSection.project_id).filter_by(id=section_id)) != project_id:
+            raise errors.section_is_not_found()
+        rank = (await append_ranks(db, Task.rank, Task.section_id, {section_id: 1}))[section_id][0]
+
+    if section_id != task.section_id:
+        section_name = await db.scalar(select(ProjectSection.name).filter_by(id=section_id))
+        db.add(TaskMessage(task_id=task.id,
+                           message_type=str(EnumMessageType.declarative),
+                           text=f"{_full_name(user.user_info)} перенёс задачу в {section_name}",
+                           created_by=user.id))
+    task.section_id = section_id
+    task.rank = rank
+    await publish(db, project_id, "task.updated", [task.id])
+    await db.commit()
+    if len(rank) > MAX_RANK_LENGTH:
+        background_tasks.add_task(rebalance, Task, section_id=section_id)
 
 
 @router.delete("/{task_id}",
                status_code=204,
-               responses=errors.with_errors())
+               responses=errors.with_errors(errors.task_not_found()))
 async def delete_task(task_id: int,
                       user: User = Depends(get_user),
                       db: Session = Depends(get_database)):
-    task = db.query(Task).filter_by(id=task_id).first()
-    db.delete(task)
-    db.commit()
+    task = await db.scalar(select(Task).filter_by(id=task_id).limit(1))
+    if task is None:
+        raise errors.task_not_found()
+    for statement in (delete(TaskMessage).filter_by(task_id=task.id),
+                      delete(TaskTimeInterval).filter_by(task_id=task.id)):
+        await db.execute(statement.execution_options(synchronize_session=False))
+    project_id = await _task_project_id(db, task)
+    await db.delete(task)
+    await publish(db, project_id, "task.deleted", [task.id])
+    await db.commit()
 
 
 @router.post("/{task_id}/start_counter",
              status_code=204,
-             responses=errors.with_errors())
+             responses=errors.with_errors(errors.task_not_found(),
+                                          errors.timer_already_started()))
 async def start_task_time_tracking(task_id: int,
                                    user: User = Depends(get_user),
                                    db: Session = Depends(get_database)):
-    task = db.query(Task).filter(id=task_id).first()
+    task = await db.scalar(select(Task).filter_by(id=task_id).limit(1))
+    if task is None:
+        raise errors.task_not_found()
+    # the partial unique index allows a single open interval per user and task
+    interval_id = await db.scalar(pg_insert(TaskTimeInterval)
+                                  .values(task_id=task.id, user_id=user.id)
+                                  .on_conflict_do_nothing(index_elements=[TaskTimeInterval.task_id,
+                                                                          TaskTimeInterval.user_id],
+                                                          index_where=TaskTimeInterval.stopped_at.is_(None))
+                                  .returning(TaskTimeInterval.id))
+    if interval_id is None:
+        raise errors.timer_already_started()
     task_message = TaskMessage()
     task_message.task_id = task.id
     task_message.message_type = str(EnumMessageType.inner)
     task_message.created_by = user.id
-    user_info = db.query(UserInfo).filter_by(user_id=user.id).first()
-    who = user_info.name
-    if user_info.surname is not None:
-        who += f" {user_info.surname}"
-    task_message.text = f"{who} запустил(а) таймер"
+    task_message.text = f"{_full_name(user.user_info)} запустил(а) таймер"
     db.add(task_message)
-    db.commit()
+    await publish(db, await _task_project_id(db, task), "task.updated", [task.id])
+    await db.commit()
 
 
 @router.put("/{task_id}/stop_counter",
             status_code=204,
-            responses=errors.with_errors())
+            responses=errors.with_errors(errors.task_not_found(),
+                                         errors.timer_not_started()))
 async def stop_task_time_tracking(task_id: int,
                                   user: User = Depends(get_user),
                                   db: Session = Depends(get_database)):
-    task = db.query(Task).filter(id=task_id).first()
+    task = await db.scalar(select(Task).filter_by(id=task_id).limit(1))
+    if task is None:
+        raise errors.task_not_found()
+    interval = (await db.execute(update(TaskTimeInterval)
+                                 .where(TaskTimeInterval.task_id == task.id,
+                                        TaskTimeInterval.user_id == user.id,
+                                        TaskTimeInterval.stopped_at.is_(None))
+                                 .values(stopped_at=func.current_timestamp())
+                                 .returning(TaskTimeInterval.started_at, TaskTimeInterval.stopped_at)
+                                 .execution_options(synchronize_session=False))).first()
+    if interval is None:
+        raise errors.timer_not_started()
+    spent = int((interval.stopped_at - interval.started_at).total_seconds())
+    await db.execute(update(Task)
+                     .where(Task.id == task.id)
+                     .values(completion_time=Task.completion_time + spent)
+                     .execution_options(synchronize_session=False))
     task_message = TaskMessage()
     task_message.task_id = task.id
     task_message.message_type = str(EnumMessageType.inner)
     task_message.created_by = user.id
-    user_info = db.query(UserInfo).filter_by(user_id=user.id).first()
-    who = user_info.name
-    if user_info.surname is not None:
-        who += f" {user_info.surname}"
-    task_message.text = f"{who} остановил(а) таймер"
+    task_message.text = f"{_full_name(user.user_info)} остановил(а) таймер"
     db.add(task_message)
-    db.commit()
+    await publish(db, await _task_project_id(db, task), "task.updated", [task.id])
+    await db.commit()
+
+
+@router.get("/time/",
+            response_model=List[TimeSpent],
+            responses=errors.with_errors(errors.access_denied()))
+async def get_time_spent(group_by: Literal["task", "user", "project"] = "task",
+                         project_id: Optional[int] = None,
+                         task_id: Optional[int] = None,
+                         user_id: Optional[int] = None,
+                         date_from: Optional[datetime] = None,
+                         date_to: Optional[datetime] = None,
+                         user: User = Depends(get_user),
+                         db: Session = Depends(get_read_database)):
+    user_projects = select(ProjectUsers.project_id).filter(ProjectUsers.user_id == user.id)
+    if project_id is not None:
+        user_in_project = await db.scalar(select(ProjectUsers).filter(ProjectUsers.project_id == project_id,
+                                                                      ProjectUsers.user_id == user.id).limit(1))
+        if user_in_project is None:
+            raise errors.access_denied()
+
+    # running intervals are counted up to now, and every interval is clipped to the range
+    started_at = TaskTimeInterval.started_at
+    stopped_at = func.coalesce(TaskTimeInterval.stopped_at, func.current_timestamp())
+    if date_from is not None:
+        started_at = func.greatest(started_at, literal(date_from, TaskTimeInterval.started_at.type))
+    if date_to is not None:
+        stopped_at = func.least(stopped_at, literal(date_to, TaskTimeInterval.stopped_at.type))
+    seconds = func.coalesce(func.sum(func.extract("epoch", stopped_at - started_at)), 0).label("seconds")
+    key = {"task": TaskTimeInterval.task_id,
+           "user": TaskTimeInterval.user_id,
+           "project": ProjectSection.project_id}[group_by]
+
+    query = (select(key, seconds)
+             .join(Task, Task.id == TaskTimeInterval.task_id)
+             .join(ProjectSection, ProjectSection.id == Task.section_id)
+             .filter(ProjectSection.project_id.in_(user_projects))
+             .group_by(key)
+             .order_by(key))
+    if project_id is not None:
+        query = query.filter(ProjectSection.project_id == project_id)
+    if task_id is not None:
+        query = query.filter(TaskTimeInterval.task_id == task_id)
+    if user_id is not None:
+        query = query.filter(TaskTimeInterval.user_id == user_id)
+    if date_from is not None:
+        query = query.filter(or_(TaskTimeInterval.stopped_at.is_(None), TaskTimeInterval.stopped_at > date_from))
+    if date_to is not None:
+        query = query.filter(TaskTimeInterval.started_at < date_to)
+
+    return [TimeSpent(**{f"{group_by}_id": row[0]}, seconds=int(row.seconds))
+            for row in await db.execute(query)]
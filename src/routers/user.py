@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
 from models.user import User
 from db import get_database, Session
-from auth import get_user
+from auth import get_user, invalidate_user
 from schemas.user import UserMe, UserMeUpdate
 from typing import Optional
 import errors
@@ -24,7 +24,7 @@ class UserService:
         )
 
     @staticmethod
-    def update_user_info(
+    async def update_user_info(
         db: Session,
         user: User,
         update_data: UserMeUpdate
@@ -51,7 +51,8 @@ class UserService:
             if getattr(update_data, field) is not None:
                 setattr(model, attr, getattr(update_data, field))
 
-        db.commit()
+        await db.commit()
+        invalidate_user(user.id)
         return user
 
 @router.get(
@@ -75,5 +76,5 @@ async def update_current_user(
     user: User = Depends(get_user),
     db: Session = Depends(get_database)
 ) -> UserMe:
-    updated_user = UserService.update_user_info(db, user, update_data)
+    updated_user = await UserService.update_user_info(db, user, update_data)
     return UserService.get_user_me(updated_user)
\ No newline at end of file
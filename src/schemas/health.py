@@ -0,0 +1,18 @@
+from typing import Literal, Optional
+
+from pydantic import BaseModel
+
+
+class PoolStatus(BaseModel):
+    size: int
+    max_overflow: int
+    checked_out: int
+    overflow: int
+    saturation: float
+
+
+class HealthStatus(BaseModel):
+    status: Literal["ok", "unavailable"]
+    database_latency_ms: Optional[float] = None
+    pool: Optional[PoolStatus] = None
+    replica_pool: Optional[PoolStatus] = None
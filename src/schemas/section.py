@@ -16,6 +16,12 @@ class SectionCreateSchema(BaseModel):
     color: int
 
 
+class SectionMoveSchema(BaseModel):
+    """Секция ставится перед before_id или после after_id, иначе в конец"""
+    before_id: Optional[int] = None
+    after_id: Optional[int] = None
+
+
 class SectionUpdateSchema(BaseModel):
     name: Optional[str]
     position: Optional[int]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -36,7 +36,7 @@ class GetTaskResponse(BaseModel):
     name: str
     description: Optional[str]
     created_at: datetime
-    created_by: UserInfoSchema
+    created_by: Optional[UserInfoSchema]
     executor: Optional[UserInfoSchema]
     priority: EnumTaskPriority
     deadline: Optional[datetime]
@@ -44,6 +44,13 @@ class GetTaskResponse(BaseModel):
     finished_at: Optional[datetime]
     completion_time: int
     tags: Optional[List[str]]
+    messages: List[TaskMessage]
+    messages_cursor: Optional[str]
+
+
+class TaskMessagePage(BaseModel):
+    items: List[TaskMessage]
+    next_cursor: Optional[str]
 
 
 class GetTaskInfo(BaseModel):
@@ -58,6 +65,16 @@ class GetTaskInfo(BaseModel):
     tags: Optional[List[str]]
 
 
+class GetTaskPage(BaseModel):
+    items: List[GetTaskInfo]
+    next_cursor: Optional[str]
+
+
+class TaskTagCount(BaseModel):
+    tag: str
+    count: int
+
+
 class UpdateTaskRequest(BaseModel):
     section_id: Optional[int]
     executor_id: Optional[int]
@@ -70,4 +87,57 @@ class UpdateTaskRequest(BaseModel):
 
     
 class CreateTask(BaseModel):
-    task_id: int
\ No newline at end of file
+    task_id: int
+
+
+class BatchCreateTaskRequest(BaseModel):
+    tasks: List[CreateTaskRequest] = Field(min_length=1, max_length=1000)
+
+
+class BatchCreateTaskResponse(BaseModel):
+    task_ids: List[int]
+
+
+class BatchUpdateTaskItem(UpdateTaskRequest):
+    id: int
+
+
+class BatchUpdateTaskRequest(BaseModel):
+    tasks: List[BatchUpdateTaskItem] = Field(min_length=1, max_length=1000)
+
+
+class ImportTaskRow(BaseModel):
+    name: str
+    section: str
+    description: Optional[str] = None
+    executor: Optional[str] = None
+    priority: Optional[EnumTaskPriority] = None
+    deadline: Optional[datetime] = None
+    finished: bool = False
+    finished_at: Optional[datetime] = None
+    completion_time: int = 0
+    tags: Optional[List[str]] = None
+
+
+class ImportRowError(BaseModel):
+    row: int
+    detail: str
+
+
+class ImportTasksResponse(BaseModel):
+    imported: int
+    errors: List[ImportRowError]
+
+
+class MoveTaskRequest(BaseModel):
+    """Задача ставится перед before_id или после after_id, иначе в конец section_id"""
+    before_id: Optional[int] = None
+    after_id: Optional[int] = None
+    section_id: Optional[int] = None
+
+
+class TimeSpent(BaseModel):
+    task_id: Optional[int] = None
+    user_id: Optional[int] = None
+    project_id: Optional[int] = None
+    seconds: int
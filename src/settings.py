@@ -1,6 +1,13 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
+    # Server
+    SERVER_ADDR: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_TEST: bool = False
+
     # Database
     DB_ADDR: str = "db"
     DB_HOST: str = "db"
@@ -8,13 +15,58 @@ class Settings(BaseSettings):
     DB_USERNAME: str
     DB_PASSWORD: str
     DB_NAME: str
+    DB_POOL_SIZE: int = 10  # 0 снимает ограничение на число соединений
+    DB_POOL_MAX_OVERFLOW: int = 10  # -1 снимает ограничение на соединения сверх DB_POOL_SIZE
+    DB_POOL_TIMEOUT: float = 3
+    DB_POOL_RECYCLE: int = 1800  # секунды, -1 отключает пересоздание соединений
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT: Optional[int] = None  # миллисекунды
+    # PgBouncer в режиме transaction: без кэша подготовленных выражений и параметров старта сессии
+    DB_PGBOUNCER: bool = False
+    # Read replica: маршруты только на чтение идут на неё, пока она доступна и не отстаёт
+    DB_REPLICA_ADDR: Optional[str] = None
+    DB_REPLICA_PORT: int = 5432
+    DB_REPLICA_MAX_LAG: float = 5  # секунды
+    DB_REPLICA_CHECK_INTERVAL: float = 1
+    DB_READ_YOUR_WRITES: int = 10  # секунды чтения с primary после собственной записи
+
+    # Health probes
+    HEALTH_TIMEOUT: float = 1
     
     # JWT
     JWT_SECRET: str
     JWT_ACCESS_EXPIRE: int = 15
     JWT_REFRESH_EXPIRE: int = 43200
     JWT_REFRESH_LONG_EXPIRE: int = 2592000
+
+    # User sessions
+    USER_SESSION_LIMIT: int = 20  # входов на участника, самые старые удаляются
+    SESSION_SWEEP_INTERVAL: float = 600  # секунды, 0 отключает фоновую очистку
+    SESSION_SWEEP_BATCH: int = 1000
+
+    # Password hashing
+    PASSWORD_SCHEME: str = "sha256_crypt"
+    PASSWORD_ROUNDS: Optional[int] = None
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE: int = 64
+
+    # Auth cache
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: int = 30
     
+    # SQL instrumentation
+    SQL_SLOW_QUERY_MS: int = 500
+    SQL_N_PLUS_ONE_THRESHOLD: int = 10
+    SQL_QUERY_BUDGET: Optional[int] = None
+
+    # Board events
+    EVENTS_BACKEND: Literal["memory", "postgres"] = "memory"
+    EVENTS_QUEUE_SIZE: int = 100
+    # LISTEN нужен прямой доступ к PostgreSQL: через PgBouncer в режиме transaction он не работает
+    EVENTS_DB_ADDR: Optional[str] = None
+    EVENTS_DB_PORT: Optional[int] = None
+
     # MinIO
     MINIO_ROOT_USER: str
     MINIO_ROOT_PASSWORD: str
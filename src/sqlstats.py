@@ -0,0 +1,144 @@
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import Scope
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Раскрытые списки IN ($1, $2, ...) разной длины считаются одним и тем же запросом
+_PARAMS_RE = re.compile(r"\$\d+(?:\s*,\s*\$\d+)*")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    """Счётчики SQL-запросов в рамках одного HTTP-запроса или блока кода"""
+
+    __slots__ = ("queries", "rows", "duration", "statements", "scope")
+
+    def __init__(self, scope: Optional[Scope] = None):
+        self.queries = 0
+        self.rows = 0
+        self.duration = 0.0
+        self.statements: Dict[str, int] = {}
+        self.scope = scope
+
+    @property
+    def route(self) -> str:
+        if self.scope is None:
+            return "-"
+        route = self.scope.get("route")
+        return route.path if route is not None else "unmatched"
+
+    @property
+    def budget(self) -> Optional[int]:
+        route = self.scope.get("route") if self.scope is not None else None
+        budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+        return budget if budget is not None else settings.SQL_QUERY_BUDGET
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Запросы, отличающиеся только параметрами и выполненные не меньше threshold раз"""
+        counts: Dict[str, int] = {}
+        for statement, count in self.statements.items():
+            statement = _PARAMS_RE.sub("?", statement)
+            counts[statement] = counts.get(statement, 0) + count
+        return sorted(((statement, count) for statement, count in counts.items() if count >= threshold),
+                      key=lambda item: item[1], reverse=True)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+_collectors: List[List[QueryStats]] = []
+
+
+@contextmanager
+def track_queries(scope: Optional[Scope] = None) -> Iterator[QueryStats]:
+    stats = QueryStats(scope)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def query_budget(limit: int) -> Callable:
+    """Объявление допустимого числа SQL-запросов для обработчика маршрута.
+
+    Декоратор ставится под @router.<method>, превышение пишется в лог
+    и роняет тесты, использующие фикстуру query_budget.
+    """
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.query_budget = limit
+        return endpoint
+    return decorator
+
+
+def check_budget(stats: QueryStats, limit: Optional[int] = None):
+    limit = limit if limit is not None else stats.budget
+    if limit is not None and stats.queries > limit:
+        statements = "\n".join(f"  {count} x {statement}"
+                               for statement, count in stats.repeated(1))
+        raise QueryBudgetExceeded(f"{stats.route}: {stats.queries} queries, budget {limit}\n{statements}")
+
+
+@contextmanager
+def collect_requests() -> Iterator[List[QueryStats]]:
+    """Сбор статистики всех HTTP-запросов, завершившихся внутри блока"""
+    collected: List[QueryStats] = []
+    _collectors.append(collected)
+    try:
+        yield collected
+    finally:
+        _collectors.remove(collected)
+
+
+def report(stats: QueryStats):
+    """Предупреждения по итогам запроса: превышение бюджета и признаки N+1"""
+    for collected in _collectors:
+        collected.append(stats)
+    budget = stats.budget
+    if budget is not None and stats.queries > budget:
+        logger.warning("Query budget exceeded on %s: %d queries, budget %d",
+                       stats.route, stats.queries, budget)
+    for statement, count in stats.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD):
+        logger.warning("Possible N+1 on %s: %d executions of %s", stats.route, count, statement)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.duration += elapsed
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        if cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+    if elapsed * 1000 >= settings.SQL_SLOW_QUERY_MS:
+        logger.warning("Slow query on %s (%.0f ms): %s", stats.route if stats is not None else "-",
+                       elapsed * 1000, statement)
+
+
+def _handle_error(context):
+    # after_cursor_execute is not called for failed statements
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine: AsyncEngine):
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", _handle_error)
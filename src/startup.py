@@ -0,0 +1,38 @@
+"""Время запуска экземпляра: импорт приложения, lifespan и первый запрос.
+
+main импортирует этот модуль первым, от него отсчитывается время импорта.
+Фазы пишутся в лог и отдаются метрикой app_startup_seconds.
+"""
+import logging
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_started = time.perf_counter()
+_lifespan_started: Optional[float] = None
+phases: Dict[str, float] = {}
+
+
+def imported():
+    # uvicorn may import the module again by its name
+    phases.setdefault("import", time.perf_counter() - _started)
+
+
+def lifespan_started():
+    global _lifespan_started
+    _lifespan_started = time.perf_counter()
+
+
+def ready():
+    now = time.perf_counter()
+    phases["lifespan"] = now - _lifespan_started
+    phases["ready"] = now - _started
+    logger.info("Ready to serve in %.0f ms: import %.0f ms, lifespan %.0f ms",
+                phases["ready"] * 1000, phases["import"] * 1000, phases["lifespan"] * 1000)
+
+
+def request_finished(elapsed: float):
+    if "first_request" not in phases:
+        phases["first_request"] = elapsed
+        logger.info("First request served in %.0f ms", elapsed * 1000)
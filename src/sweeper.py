@@ -0,0 +1,106 @@
+"""Фоновая очистка user_session.
+
+Каждый вход добавляет строку в user_session, а удаляют их только выход
+и несовпадение отпечатка. Раз в SESSION_SWEEP_INTERVAL секунд удаляются
+истёкшие сессии и входы сверх USER_SESSION_LIMIT на участника. Удаление
+идёт пачками по SESSION_SWEEP_BATCH строк, каждая в своей транзакции,
+поэтому очистка не держит долгих блокировок и не раздувает WAL одной транзакцией.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from auth import delete_sessions, trim_user_sessions
+from db import with_database
+from metrics import SESSIONS_PURGED
+from models.user import UserSession
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSweeper:
+    def __init__(self, interval: float, batch_size: int, limit: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.limit = limit
+        self._task: Optional[asyncio.Task] = None
+
+    async def _purge_expired(self) -> int:
+        total = 0
+        while True:
+            async with with_database() as db:
+                # workers sweeping at the same time take different rows
+                expired = (select(UserSession.id)
+                           .filter(UserSession.invalid_after < func.now())
+                           .limit(self.batch_size)
+                           .with_for_update(skip_locked=True))
+                removed = await delete_sessions(db, UserSession.id.in_(expired))
+            total += removed
+            if removed < self.batch_size:
+                return total
+
+    async def _purge_over_limit(self) -> int:
+        async with with_database() as db:
+            user_ids = (await db.scalars(select(UserSession.user_id)
+                                         .group_by(UserSession.user_id)
+                                         .having(func.count() > self.limit))).all()
+        total = 0
+        for user_id in user_ids:
+            while True:
+                async with with_database() as db:
+                    removed = await trim_user_sessions(db, user_id, self.limit, self.batch_size)
+                total += removed
+                if removed < self.batch_size:
+                    break
+        return total
+
+    async def sweep(self) -> Dict[str, int]:
+        """Один проход очистки; возвращает число удалённых сессий по причинам"""
+        started = time.perf_counter()
+        reclaimed = {"expired": await self._purge_expired(),
+                     "over_limit": await self._purge_over_limit()}
+        for reason, count in reclaimed.items():
+            SESSIONS_PURGED.labels(reason).inc(count)
+        logger.info("Session sweep removed %d expired and %d over-limit sessions in %.2fs",
+                    reclaimed["expired"], reclaimed["over_limit"], time.perf_counter() - started)
+        return reclaimed
+
+    async def _run(self):
+        while True:
+            # the first sweep waits a full interval so that it doesn't slow down startup
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except (OSError, SQLAlchemyError) as e:
+                logger.warning("Session sweep failed: %s", e)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+sweeper = (SessionSweeper(settings.SESSION_SWEEP_INTERVAL, settings.SESSION_SWEEP_BATCH, settings.USER_SESSION_LIMIT)
+           if settings.SESSION_SWEEP_INTERVAL > 0 else None)
+
+
+async def start_session_sweeper():
+    if sweeper is not None:
+        sweeper.start()
+
+
+async def stop_session_sweeper():
+    if sweeper is not None:
+        await sweeper.stop()
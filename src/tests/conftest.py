@@ -0,0 +1,176 @@
+"""Фикстуры тестов.
+
+Тесты с фикстурой client работают с настоящей PostgreSQL из настроек
+приложения (переменные окружения или .env): схема накатывается миграциями,
+каждый тест создаёт свои данные через factory. Без доступной БД такие
+тесты пропускаются. Долгие тесты (slow) запускаются только с --run-slow.
+
+    cd src && python -m pytest tests [--run-slow]
+"""
+import asyncio
+import uuid
+from typing import Any, Callable, Dict, Iterator, List
+
+import asyncpg
+import pytest
+from fastapi.testclient import TestClient
+
+from db import database_url
+from events import hub
+from db.migrate import migrate
+from passwords import password_context
+from ranks import even_ranks
+
+pytest_plugins = ["pytest_sqlstats"]
+
+PASSWORD = "test-password"
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", help="run tests marked slow")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: long-running test on a large dataset, needs --run-slow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip = pytest.mark.skip(reason="slow test, use --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+class Factory:
+    """Создание тестовых данных напрямую в БД, минуя API"""
+
+    def __init__(self):
+        self.password_hash = password_context().hash(PASSWORD)
+
+    def _run(self, sql: str, *args) -> List[asyncpg.Record]:
+        async def run():
+            connection = await asyncpg.connect(database_url("postgresql"))
+            try:
+                return await connection.fetch(sql, *args)
+            finally:
+                await connection.close()
+        return asyncio.run(run())
+
+    def user(self) -> Dict[str, Any]:
+        login = f"test_{uuid.uuid4().hex[:12]}"
+        user_id = self._run('INSERT INTO "user" (username, password, email) VALUES ($1, $2, $3) RETURNING id',
+                            login, self.password_hash, f"{login}@example.com")[0]["id"]
+        self._run("INSERT INTO user_info (user_id, surname, name) VALUES ($1, 'Test', 'User')", user_id)
+        return {"id": user_id, "login": login}
+
+    def project(self, owner: Dict[str, Any], sections: int = 1, tasks_per_section: int = 0,
+                messages_per_task: int = 0, intervals_per_task: int = 0) -> Dict[str, Any]:
+        project_id = self._run("INSERT INTO project (name, created_by) VALUES ($1, $2) RETURNING id",
+                               f"Project {uuid.uuid4().hex[:12]}", owner["id"])[0]["id"]
+        self._run("INSERT INTO project_user (project_id, user_id) VALUES ($1, $2)", project_id, owner["id"])
+        section_ids = [row["id"] for row in self._run(
+            "INSERT INTO project_section (project_id, position, rank, name) "
+            "SELECT $1, n, rank, 'Section ' || n FROM unnest($2::text[]) WITH ORDINALITY AS s(rank, n) "
+            "RETURNING id", project_id, even_ranks(sections))]
+        task_ids = []
+        if tasks_per_section:
+            task_ranks = even_ranks(tasks_per_section)
+            task_ids = [row["id"] for row in self._run(
+                "INSERT INTO task (name, section_id, created_by, rank) "
+                "SELECT 'Task ' || n, section_id, $3, rank "
+                "FROM unnest($1::int[], $2::text[]) WITH ORDINALITY AS t(section_id, rank, n) RETURNING id",
+                [section_id for section_id in section_ids for _ in task_ranks],
+                task_ranks * len(section_ids), owner["id"])]
+        if task_ids and messages_per_task:
+            self._run("INSERT INTO task_message (task_id, message_type, text, created_by) "
+                      "SELECT task_id, 'inner', 'Message ' || n, $2 "
+                      "FROM unnest($1::int[]) AS task_id, generate_series(1, $3) AS n",
+                      task_ids, owner["id"], messages_per_task)
+        if task_ids and intervals_per_task:
+            self._run("INSERT INTO task_time_interval (task_id, user_id, started_at, stopped_at) "
+                      "SELECT task_id, $2, now() - n * interval '1 hour', now() - n * interval '1 hour' "
+                      "+ interval '30 minutes' "
+                      "FROM unnest($1::int[]) AS task_id, generate_series(1, $3) AS n",
+                      task_ids, owner["id"], intervals_per_task)
+        return {"id": project_id, "section_ids": section_ids, "task_ids": task_ids}
+
+    def count(self, sql: str, *args) -> int:
+        return self._run(sql, *args)[0][0]
+
+    def execute(self, sql: str, *args) -> List[asyncpg.Record]:
+        """Произвольный запрос к БД, например чтобы изменить данные в обход API"""
+        return self._run(sql, *args)
+
+
+@pytest.fixture(scope="session")
+def database():
+    async def check():
+        connection = await asyncpg.connect(database_url("postgresql"), timeout=3)
+        await connection.close()
+
+    try:
+        asyncio.run(check())
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        pytest.skip(f"database is not available: {e}")
+    asyncio.run(migrate())
+
+
+@pytest.fixture(scope="session")
+def factory(database) -> Factory:
+    return Factory()
+
+
+@pytest.fixture(scope="session")
+def client(database) -> Iterator[TestClient]:
+    # one client for the whole session: pooled connections are bound to its event loop
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+class EventRecorder:
+    """Подписчик хаба событий, запоминающий события вместо очереди"""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+
+    def full(self) -> bool:
+        return False
+
+    def put_nowait(self, message: Dict[str, Any]):
+        self.events.append(message)
+
+
+@pytest.fixture
+def board_events() -> Iterator[Callable[[int], EventRecorder]]:
+    """Запись событий доски проекта: board_events(project_id) возвращает EventRecorder"""
+    attached = []
+
+    def record(project_id: int) -> EventRecorder:
+        recorder = EventRecorder()
+        hub.attach(project_id, recorder)
+        attached.append((project_id, recorder))
+        return recorder
+
+    yield record
+    for project_id, recorder in attached:
+        hub.detach(project_id, recorder)
+
+
+def login(client: TestClient, user: Dict[str, Any]):
+    response = client.post("/api/auth/login", json={"login": user["login"], "password": PASSWORD,
+                                                    "remember_me": False})
+    assert response.status_code == 200, response.text
+
+
+def request_queries(client: TestClient, query_budget: Callable, method: str, url: str, **kwargs) -> int:
+    """Число SQL-запросов, выполненных одним запросом к API"""
+    # the first request fills the auth cache, its lookups are not part of the measured request
+    client.get("/api/project/all/")
+    with query_budget() as requests:
+        response = client.request(method, url, **kwargs)
+    assert response.is_success, response.text
+    return requests[0].queries
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import cache_session, get_cached_session, user_cache
+from models.user import User, UserInfo, UserSession
+
+
+def test_cached_user_has_no_password_hash():
+    user = User(id=1, username="cached", email="cached@example.com", is_active=True)
+    user.set_password_hash("$5$rounds=535000$secret")
+    user.user_info = UserInfo(user_id=1, surname="Test", name="User")
+    session = UserSession(id=10, user_id=1, fingerprint="fp", identity="identity",
+                          invalid_after=datetime.now(timezone.utc))
+    session.user = user
+    cache_session(session)
+
+    cached_user, cached_info = user_cache.get(1)
+    assert "$5$rounds=535000$secret" not in cached_user.values()
+    restored = get_cached_session(10, "identity", AsyncSession())
+    assert restored.user.username == "cached"
+    assert restored.user.user_info.surname == "Test"
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from conftest import login, request_queries
+
+
+def _project_rows(factory, project) -> int:
+    return factory.count(
+        "SELECT (SELECT count(*) FROM project WHERE id = $1) "
+        "     + (SELECT count(*) FROM project_section WHERE project_id = $1) "
+        "     + (SELECT count(*) FROM task WHERE id = ANY($2::int[])) "
+        "     + (SELECT count(*) FROM task_message WHERE task_id = ANY($2::int[])) "
+        "     + (SELECT count(*) FROM task_time_interval WHERE task_id = ANY($2::int[]))",
+        project["id"], project["task_ids"])
+
+
+def test_project_delete_is_set_based_on_a_large_project(client, factory, query_budget):
+    user = factory.user()
+    login(client, user)
+    small = factory.project(user, sections=1, tasks_per_section=1, messages_per_task=1, intervals_per_task=1)
+    large = factory.project(user, sections=50, tasks_per_section=40, messages_per_task=3, intervals_per_task=2)
+    assert _project_rows(factory, large) == 1 + 50 + 2000 + 6000 + 4000
+
+    counts = [request_queries(client, query_budget, "DELETE", f"/api/project/{project['id']}")
+              for project in (small, large)]
+
+    assert counts[0] == counts[1]
+    assert _project_rows(factory, small) == _project_rows(factory, large) == 0
+
+
+def test_section_delete_is_set_based_on_a_large_section(client, factory, query_budget):
+    user = factory.user()
+    login(client, user)
+    small = factory.project(user, sections=1, tasks_per_section=1, messages_per_task=1, intervals_per_task=1)
+    large = factory.project(user, sections=1, tasks_per_section=2000, messages_per_task=3, intervals_per_task=1)
+
+    counts = [request_queries(client, query_budget, "DELETE",
+                              f"/api/sections/{project['id']}/section/{project['section_ids'][0]}")
+              for project in (small, large)]
+
+    assert counts[0] == counts[1]
+    for project in (small, large):
+        # only the project row itself is left
+        assert _project_rows(factory, project) == 1
+
+
+@pytest.mark.slow
+def test_project_delete_of_100k_tasks(client, factory, query_budget):
+    user = factory.user()
+    login(client, user)
+    small = factory.project(user, sections=1, tasks_per_section=1, messages_per_task=1, intervals_per_task=1)
+    large = factory.project(user, sections=200, tasks_per_section=500, messages_per_task=1, intervals_per_task=1)
+    assert len(large["task_ids"]) == 100000
+
+    started = time.perf_counter()
+    large_queries = request_queries(client, query_budget, "DELETE", f"/api/project/{large['id']}")
+    elapsed = time.perf_counter() - started
+
+    assert request_queries(client, query_budget, "DELETE", f"/api/project/{small['id']}") == large_queries
+    assert _project_rows(factory, large) == 0
+    # set-based deletes of 300k rows take seconds; a per-row cascade (an unindexed foreign key,
+    # for instance) scans the child tables once per task and takes far longer
+    assert elapsed < 60
@@ -0,0 +1,40 @@
+from typing import Callable, Dict, List
+
+from conftest import login
+
+
+def _revalidate(client, urls: List[str]) -> Callable[[], Dict[str, int]]:
+    """Статусы условных запросов с ETag, полученными сейчас"""
+    etags = {url: client.get(url).headers["ETag"] for url in urls}
+    return lambda: {url: client.get(url, headers={"If-None-Match": etag}).status_code
+                    for url, etag in etags.items()}
+
+
+def test_section_etags_see_an_earlier_stamped_change_committed_later(client, factory):
+    user = factory.user()
+    login(client, user)
+    project = factory.project(user, sections=2)
+    first, second = project["section_ids"]
+    factory.execute("UPDATE project_section SET updated_at = now() WHERE id = $1", first)
+    factory.execute("UPDATE project_section SET updated_at = now() - interval '1 hour' WHERE id = $1", second)
+    urls = [f"/api/sections/{project['id']}/section", f"/api/project/{project['id']}"]
+    statuses = _revalidate(client, urls)
+    assert set(statuses().values()) == {304}
+
+    # a transaction stamped before the latest change commits after it: max(updated_at) stays the same
+    factory.execute("UPDATE project_section SET name = 'Renamed', updated_at = now() - interval '30 minutes' "
+                    "WHERE id = $1", second)
+    assert set(statuses().values()) == {200}
+
+
+def test_task_card_etag_follows_executor_and_creator_names(client, factory):
+    user = factory.user()
+    executor = factory.user()
+    login(client, user)
+    task_id = factory.project(user, sections=1, tasks_per_section=1)["task_ids"][0]
+    factory.execute("UPDATE task SET executor_id = $1 WHERE id = $2", executor["id"], task_id)
+    for who in (executor, user):
+        statuses = _revalidate(client, [f"/api/task/{task_id}"])
+        assert set(statuses().values()) == {304}
+        factory.execute("UPDATE user_info SET name = 'Renamed' WHERE user_id = $1", who["id"])
+        assert set(statuses().values()) == {200}
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import asyncpg
+import pytest
+
+import events
+from db import database_url
+from conftest import EventRecorder
+from events import CHANNEL, PostgresListener
+from settings import settings
+
+PROJECT_ID = -1
+
+
+async def _notify(connection: asyncpg.Connection, type: str):
+    await connection.execute("SELECT pg_notify($1, $2)", CHANNEL,
+                             json.dumps({"type": type, "project_id": PROJECT_ID, "ids": [1]}))
+
+
+async def _wait_for(recorder: EventRecorder, type: str, connection: asyncpg.Connection = None):
+    async with asyncio.timeout(10):
+        while not any(event["type"] == type for event in recorder.events):
+            if connection is not None:
+                await _notify(connection, type)
+            await asyncio.sleep(0.05)
+
+
+def test_listener_reconnects_and_requests_resync(database, board_events, monkeypatch):
+    monkeypatch.setattr(events, "RECONNECT_DELAY", 0.01)
+
+    async def run():
+        listener = PostgresListener(database_url("postgresql"))
+        recorder = board_events(PROJECT_ID)
+        connection = await asyncpg.connect(database_url("postgresql"))
+        listener.start()
+        try:
+            await _wait_for(recorder, "before", connection)
+            await connection.execute("SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                                     "WHERE pid <> pg_backend_pid() AND query = $1", f'LISTEN "{CHANNEL}"')
+            await _wait_for(recorder, "resync")
+            await _wait_for(recorder, "after", connection)
+        finally:
+            await listener.stop()
+            await connection.close()
+
+    asyncio.run(run())
+
+
+def test_listener_keeps_retrying_when_database_is_unavailable(monkeypatch):
+    monkeypatch.setattr(events, "RECONNECT_DELAY", 0.01)
+    monkeypatch.setattr(events, "RECONNECT_MAX_DELAY", 0.01)
+
+    async def run():
+        listener = PostgresListener("postgresql://nobody@127.0.0.1:1/nothing")
+        listener.start()
+        try:
+            await asyncio.sleep(0.2)
+            assert listener.running
+        finally:
+            await listener.stop()
+
+    asyncio.run(run())
+
+
+def test_postgres_events_need_a_direct_connection_behind_pgbouncer(monkeypatch):
+    monkeypatch.setattr(settings, "EVENTS_BACKEND", "postgres")
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+    monkeypatch.setattr(settings, "EVENTS_DB_ADDR", None)
+    with pytest.raises(RuntimeError, match="EVENTS_DB_ADDR"):
+        asyncio.run(events.start_events())
@@ -0,0 +1,17 @@
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from db import database_url
+from routers.health import _pool_status
+from settings import settings
+
+
+def test_unlimited_pool_is_never_saturated(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_MAX_OVERFLOW", 0)
+    engine = create_async_engine(database_url(), pool_size=0, max_overflow=0)
+    assert _pool_status(engine).saturation == 0.0
+
+
+def test_ready_reports_pool_saturation(client):
+    response = client.get("/health/ready")
+    assert response.status_code == 200, response.text
+    assert 0 <= response.json()["pool"]["saturation"] <= 1
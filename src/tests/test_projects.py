@@ -0,0 +1,17 @@
+from conftest import login, request_queries
+
+
+def test_all_projects_query_count_does_not_depend_on_project_count(client, factory, query_budget):
+    user = factory.user()
+    login(client, user)
+    factory.project(user, sections=2)
+    few = request_queries(client, query_budget, "GET", "/api/project/all/")
+    for _ in range(5):
+        factory.project(user, sections=20)
+    many = request_queries(client, query_budget, "GET", "/api/project/all/")
+
+    # projects and their sections: one statement each
+    assert [few, many] == [2, 2]
+    projects = client.get("/api/project/all/").json()
+    assert len(projects) == 6
+    assert sorted(len(project["section_ids"]) for project in projects) == [2] + [20] * 5
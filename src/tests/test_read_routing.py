@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+
+from auth import invalidate_user
+from conftest import login
+from db.session import engine
+
+
+@contextmanager
+def peak_connections() -> Iterator[List[int]]:
+    """Наибольшее число одновременно занятых соединений пула primary внутри блока"""
+    pool = engine.sync_engine.pool
+    peak = [0]
+
+    def checkout(*args):
+        peak[0] = max(peak[0], pool.checkedout())
+
+    event.listen(pool, "checkout", checkout)
+    try:
+        yield peak
+    finally:
+        event.remove(pool, "checkout", checkout)
+
+
+def test_read_routes_share_the_auth_connection(client, factory):
+    user = factory.user()
+    login(client, user)
+    project = factory.project(user, sections=1, tasks_per_section=1)
+    for url in ("/api/project/all/", f"/api/task/{project['task_ids'][0]}",
+                f"/api/task/all/?project_id={project['id']}"):
+        invalidate_user(user["id"])
+        with peak_connections() as peak:
+            response = client.get(url)
+        assert response.status_code == 200, response.text
+        assert peak == [1], url
+
+
+def test_pool_metrics_are_labelled(client):
+    response = client.get("/metrics")
+    assert 'db_pool_size{pool="primary"}' in response.text
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import pytest
+
+import sqlstats
+from sqlstats import QueryBudgetExceeded, QueryStats, check_budget, query_budget as declare_budget
+
+
+def _request(queries: int, budget: int) -> QueryStats:
+    @declare_budget(budget)
+    def endpoint():
+        pass
+
+    stats = QueryStats({"route": SimpleNamespace(path="/api/test", endpoint=endpoint)})
+    stats.queries = queries
+    stats.statements = {"SELECT 1": queries}
+    return stats
+
+
+def test_check_budget_uses_the_declared_budget():
+    check_budget(_request(queries=2, budget=2))
+    with pytest.raises(QueryBudgetExceeded, match="/api/test: 3 queries, budget 2"):
+        check_budget(_request(queries=3, budget=2))
+
+
+def test_query_budget_fixture_fails_on_an_exceeded_budget(query_budget):
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget():
+            sqlstats.report(_request(queries=3, budget=2))
+
+
+def test_query_budget_fixture_limit_overrides_the_declared_budget(query_budget):
+    with query_budget(5):
+        sqlstats.report(_request(queries=3, budget=2))
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(1):
+            sqlstats.report(_request(queries=2, budget=10))
@@ -0,0 +1,35 @@
+from conftest import login
+
+
+def test_batch_update_rejects_duplicate_ids(client, factory):
+    user = factory.user()
+    login(client, user)
+    project = factory.project(user, sections=1, tasks_per_section=2)
+    first, second = project["task_ids"]
+
+    response = client.patch("/api/task/batch", json={"tasks": [
+        {"id": first, "section_id": None, "executor_id": None, "priority": "high", "deadline": None,
+         "finished": None, "finished_at": None, "completion_time": None, "tags": None},
+        {"id": first, "section_id": None, "executor_id": None, "priority": "low", "deadline": None,
+         "finished": None, "finished_at": None, "completion_time": None, "tags": None},
+    ]})
+    assert response.status_code == 422
+    assert factory.count("SELECT count(*) FROM task WHERE id = ANY($1::int[]) AND priority = 'medium'",
+                         [first, second]) == 2
+
+
+def test_batch_update_applies_each_task_once(client, factory):
+    user = factory.user()
+    login(client, user)
+    project = factory.project(user, sections=1, tasks_per_section=2)
+    first, second = project["task_ids"]
+
+    response = client.patch("/api/task/batch", json={"tasks": [
+        {"id": first, "section_id": None, "executor_id": None, "priority": "high", "deadline": None,
+         "finished": None, "finished_at": None, "completion_time": None, "tags": None},
+        {"id": second, "section_id": None, "executor_id": None, "priority": "low", "deadline": None,
+         "finished": None, "finished_at": None, "completion_time": None, "tags": None},
+    ]})
+    assert response.status_code == 204, response.text
+    assert factory.count("SELECT count(*) FROM task WHERE (id, priority) IN (($1, 'high'), ($2, 'low'))",
+                         first, second) == 2
@@ -0,0 +1,27 @@
+from conftest import login
+
+
+def test_task_card_without_creator_info(client, factory):
+    user = factory.user()
+    creator = factory.user()
+    login(client, user)
+    task_id = factory.project(user, sections=1, tasks_per_section=1)["task_ids"][0]
+    factory.execute("UPDATE task SET created_by = $1 WHERE id = $2", creator["id"], task_id)
+    factory.execute("DELETE FROM user_info WHERE user_id = $1", creator["id"])
+
+    response = client.get(f"/api/task/{task_id}")
+    assert response.status_code == 200, response.text
+    assert response.json()["created_by"] is None
+
+
+def test_task_messages_are_for_project_members_only(client, factory):
+    owner = factory.user()
+    task_id = factory.project(owner, sections=1, tasks_per_section=1, messages_per_task=3)["task_ids"][0]
+    login(client, factory.user())
+    assert client.get(f"/api/task/{task_id}/messages").status_code == 403
+    assert client.get("/api/task/0/messages").status_code == 404
+
+    login(client, owner)
+    response = client.get(f"/api/task/{task_id}/messages")
+    assert response.status_code == 200, response.text
+    assert len(response.json()["items"]) == 3
@@ -0,0 +1,42 @@
+from conftest import login, request_queries
+
+
+def test_task_list_query_count_does_not_depend_on_task_count(client, factory, query_budget):
+    user = factory.user()
+    login(client, user)
+    small = factory.project(user, sections=1, tasks_per_section=2)
+    large = factory.project(user, sections=10, tasks_per_section=40)
+
+    # tasks, their executors and the keyset page come from one joined statement
+    assert [request_queries(client, query_budget, "GET", "/api/task/page/",
+                            params={"project_id": project["id"], "limit": 500})
+            for project in (small, large)] == [1, 1]
+
+
+def test_task_pages_cover_the_project_in_section_order(client, factory):
+    user = factory.user()
+    login(client, user)
+    project = factory.project(user, sections=3, tasks_per_section=7)
+    for order in ("priority", "rank"):
+        seen, cursor = [], None
+        while True:
+            params = {"project_id": project["id"], "limit": 4, "order": order}
+            if cursor is not None:
+                params["cursor"] = cursor
+            page = client.get("/api/task/page/", params=params).json()
+            seen += page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert sorted(task["id"] for task in seen) == sorted(project["task_ids"]), order
+        assert [task["section_id"] for task in seen] == sorted(task["section_id"] for task in seen), order
+
+
+def test_all_tasks_keep_the_list_shape_without_a_limit(client, factory):
+    user = factory.user()
+    login(client, user)
+    project = factory.project(user, sections=2, tasks_per_section=120)
+
+    response = client.get("/api/task/all/", params={"project_id": project["id"]})
+    assert response.status_code == 200, response.text
+    assert sorted(task["id"] for task in response.json()) == sorted(project["task_ids"])
@@ -0,0 +1,15 @@
+from conftest import login
+
+
+def test_timer_start_and_stop_publish_task_updates(client, factory, board_events):
+    user = factory.user()
+    login(client, user)
+    project = factory.project(user, sections=1, tasks_per_section=1)
+    task_id = project["task_ids"][0]
+    recorder = board_events(project["id"])
+
+    assert client.post(f"/api/task/{task_id}/start_counter").status_code == 204
+    assert client.post(f"/api/task/{task_id}/start_counter").status_code == 409
+    assert client.put(f"/api/task/{task_id}/stop_counter").status_code == 204
+
+    assert [(event["type"], event["ids"]) for event in recorder.events] == [("task.updated", [task_id])] * 2